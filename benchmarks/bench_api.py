@@ -0,0 +1,86 @@
+"""Пропускная способность JSON API против HTML-страниц лент.
+
+    python -m benchmarks.bench_api --posts 10000 --seconds 5
+
+Запросы идут через тестовый клиент Django (весь стек middleware, без
+сети), в один поток. Для каждой ленты замеряются HTML-страница, ответ
+API и повторный запрос API с If-None-Match (304). Список постов
+главной HTML-страницы берётся из кеша ленты, как и в работе.
+"""
+import time
+
+from benchmarks.common import (
+    parser, print_row, setup_django, temporary_database, timer
+)
+
+
+def generate(total):
+    from posts.models import Comment, Group, Post, User
+
+    author = User.objects.create_user(username="bench")
+    group = Group.objects.create(title="bench", slug="bench")
+    posts = [
+        Post(text=f"Пост номер {number}. " * 10, author=author, group=group)
+        for number in range(total)
+    ]
+    Post.objects.bulk_create(posts)
+    post = Post.objects.order_by("-pub_date", "-id").first()
+    Comment.objects.bulk_create(
+        Comment(post=post, author=author, text=f"Комментарий {number}")
+        for number in range(200)
+    )
+    return post
+
+
+def throughput(client, url, seconds, **headers):
+    """Число запросов в секунду и время каждого запроса"""
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = client.get(url, **headers)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code in (200, 304), (url, response.status_code)
+    return len(samples) / sum(samples), samples
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--posts", type=int, default=10000)
+    args.add_argument("--seconds", type=float, default=5)
+    options = args.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    with temporary_database(), override_settings(ALLOWED_HOSTS=["*"]):
+        with timer(f"Генерация {options.posts} постов"):
+            post = generate(options.posts)
+        client = Client()
+        pairs = [
+            ("главная", reverse("index"), reverse("api_index")),
+            ("группа", reverse("group", args=["bench"]),
+             reverse("api_group", args=["bench"])),
+            ("профиль", reverse("profile", args=["bench"]),
+             reverse("api_profile", args=["bench"])),
+            ("пост", reverse("post", args=["bench", post.id]),
+             reverse("api_post", args=[post.id])),
+        ]
+        for name, html_url, api_url in pairs:
+            etag = client.get(api_url)["ETag"]
+            print(f"\n{name}")
+            for label, url, headers in (
+                ("HTML", html_url, {}),
+                ("API", api_url, {}),
+                ("API, 304", api_url, {"HTTP_IF_NONE_MATCH": etag}),
+            ):
+                rate, samples = throughput(
+                    client, url, options.seconds, **headers
+                )
+                print_row(f"{label} ({rate:.0f} запр/с)", samples)
+
+
+if __name__ == "__main__":
+    main()
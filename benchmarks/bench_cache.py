@@ -0,0 +1,96 @@
+"""Попадания и задержка кеша при нескольких процессах-воркерах.
+
+    python -m benchmarks.bench_cache --workers 8
+
+Каждый воркер читает ключи с распределением Ципфа (горячие страницы
+популярны), при промахе «строит» значение (--build-ms) и кладёт его в
+кеш. LocMemCache у каждого процесса свой, SQLiteCache — общий.
+"""
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import parser, summary
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "sqlite": "yatube.cache.SQLiteCache",
+}
+
+
+def configure(backend, location):
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(CACHES={"default": {
+            "BACKEND": BACKENDS[backend],
+            "LOCATION": location,
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }})
+    from django.core.cache import cache
+    return cache
+
+
+def worker(backend, location, options, seed, results):
+    cache = configure(backend, location)
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(options["keys"])]
+    keys = rng.choices(range(options["keys"]), weights, k=options["ops"])
+    value = "x" * options["value_size"]
+    hits = 0
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        if cache.get(f"page:{key}") is None:
+            time.sleep(options["build_ms"] / 1000)
+            cache.set(f"page:{key}", value, 600)
+        else:
+            hits += 1
+        samples.append(time.perf_counter() - started)
+    results.put((hits, samples))
+
+
+def run(backend, options):
+    with tempfile.TemporaryDirectory() as directory:
+        location = os.path.join(directory, "cache.sqlite3")
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=worker,
+                args=(backend, location, options, seed, results),
+            )
+            for seed in range(options["workers"])
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+    hits = sum(hit for hit, _ in collected)
+    samples = [sample for _, chunk in collected for sample in chunk]
+    stats = summary(samples)
+    print(
+        f"{backend:<7} hit rate {hits / len(samples):6.1%}  "
+        f"p50 {stats['p50']:7.3f} ms  p95 {stats['p95']:7.3f} ms  "
+        f"p99 {stats['p99']:7.3f} ms  {len(samples) / elapsed:9.0f} ops/s"
+    )
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--workers", type=int, default=4)
+    args.add_argument("--ops", type=int, default=20000)
+    args.add_argument("--keys", type=int, default=2000)
+    args.add_argument("--value-size", type=int, default=20000)
+    args.add_argument("--build-ms", type=float, default=2.0)
+    options = vars(args.parse_args())
+    multiprocessing.set_start_method("spawn")
+    for backend in BACKENDS:
+        run(backend, options)
+
+
+if __name__ == "__main__":
+    main()
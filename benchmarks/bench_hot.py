@@ -0,0 +1,78 @@
+"""Лента «Популярное»: цена рейтинга на запись и на чтение.
+
+    python -m benchmarks.bench_hot --posts 20000 --comments 50000
+
+Данные — генератор benchmarks/dataset.py. Запись: время одного
+комментария (Comment.objects.create со всеми сигналами) без обновления
+рейтинга и с ним — рейтинг добавляется в тот же UPDATE, что и счётчик
+комментариев. Чтение: первая страница ленты по индексу (-hot_score, -id)
+против того же топа, посчитанного агрегатом по комментариям за двое
+суток на каждый запрос.
+"""
+import random
+from datetime import timedelta
+from unittest import mock
+
+from benchmarks import dataset
+from benchmarks.common import (
+    measure, parser, print_row, setup_django, temporary_database, timer
+)
+
+
+def main():
+    args = parser(__doc__)
+    dataset.add_arguments(args)
+    args.add_argument("--repeat", type=int, default=500)
+    options = args.parse_args()
+
+    setup_django()
+    from django.db.models import Count, Q
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from posts import hot
+    from posts.models import Comment, Post, User
+
+    params = {name: getattr(options, name) for name in dataset.DEFAULTS}
+    params["seed"] = options.seed
+    with temporary_database(), override_settings(
+        THUMBNAIL_ASYNC=False, NPLUSONE_MODE="off"
+    ):
+        with timer("Генерация данных"):
+            dataset.generate(params)
+        with timer("Пересчёт рейтингов"):
+            hot.rebuild()
+        rng = random.Random(options.seed)
+        post_ids = list(Post.objects.values_list("id", flat=True))
+        users = list(User.objects.all()[:100])
+
+        def comment():
+            Comment.objects.create(
+                post_id=rng.choice(post_ids), author=rng.choice(users),
+                text="ответ",
+            )
+
+        with mock.patch.object(hot, "comment_changes", return_value={}):
+            print_row("комментарий без рейтинга", measure(
+                comment, options.repeat
+            ))
+        print_row("комментарий с рейтингом", measure(comment, options.repeat))
+
+        def indexed():
+            list(hot.hot_posts()[:10])
+
+        def aggregate():
+            since = timezone.now() - timedelta(days=2)
+            list(Post.objects.for_feed().annotate(
+                recent=Count("comments", filter=Q(comments__created__gte=since))
+            ).order_by("-recent", "-id")[:10])
+
+        print_row("страница: индекс hot_score", measure(
+            indexed, options.repeat
+        ))
+        print_row("страница: агрегат по комментариям", measure(
+            aggregate, max(options.repeat // 10, 1)
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Скорость массового импорта (manage.py import_content).
+
+    python -m benchmarks.bench_import --posts 100000 --batch-size 1000
+
+Генерирует JSONL с постами, комментариями и подписками и импортирует
+их во временную базу, печатая число записей в секунду для каждого вида.
+"""
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import parser, setup_django, temporary_database
+
+USERS = 1000
+
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as stream:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--posts", type=int, default=100000)
+    args.add_argument("--batch-size", type=int, default=1000)
+    args.add_argument("--seed", type=int, default=1)
+    options = args.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from posts.models import Group, User, UserStats
+
+    rng = random.Random(options.seed)
+    usernames = [f"user{number}" for number in range(USERS)]
+    kinds = {
+        "posts": [
+            {
+                "id": number + 1,
+                "author": rng.choice(usernames),
+                "text": f"Импортированный пост {number} " * 5,
+                "group": rng.choice(("one", "two", None)),
+            }
+            for number in range(options.posts)
+        ],
+        "comments": [
+            {
+                "post": rng.randint(1, options.posts),
+                "author": rng.choice(usernames),
+                "text": f"Комментарий {number}",
+            }
+            for number in range(options.posts)
+        ],
+        "follows": [
+            {"user": user, "author": author}
+            for user, author in {
+                tuple(rng.sample(usernames, 2))
+                for _ in range(options.posts // 10)
+            }
+        ],
+    }
+    with temporary_database(), tempfile.TemporaryDirectory() as directory:
+        User.objects.bulk_create(User(username=name) for name in usernames)
+        UserStats.objects.bulk_create(
+            UserStats(user_id=pk) for pk in User.objects.values_list(
+                "pk", flat=True
+            )
+        )
+        Group.objects.bulk_create([
+            Group(title="one", slug="one"), Group(title="two", slug="two")
+        ])
+        for kind, records in kinds.items():
+            path = os.path.join(directory, f"{kind}.jsonl")
+            write_jsonl(path, records)
+            started = time.perf_counter()
+            call_command(
+                "import_content", kind, path,
+                batch_size=options.batch_size, stdout=open(os.devnull, "w"),
+            )
+            elapsed = time.perf_counter() - started
+            print(
+                f"{kind:<10} {len(records):>9} записей  {elapsed:7.1f} s  "
+                f"{len(records) / elapsed:9.0f} записей/с"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Накладные расходы MetricsMiddleware.
+
+    python -m benchmarks.bench_metrics --posts 1000 --repeat 500
+
+Одни и те же страницы запрашиваются тестовым клиентом без middleware
+метрик и с ним, поочерёдно; печатаются задержки и разница медиан.
+"""
+import statistics
+
+from benchmarks.common import (
+    measure, parser, print_row, setup_django, temporary_database
+)
+
+METRICS = "yatube.metrics.MetricsMiddleware"
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--posts", type=int, default=1000)
+    args.add_argument("--repeat", type=int, default=500)
+    options = args.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from posts.models import Comment, Post, User
+
+    with temporary_database(), override_settings(ALLOWED_HOSTS=["*"]):
+        author = User.objects.create_user(username="bench")
+        Post.objects.bulk_create(
+            Post(text=f"Пост {number}", author=author)
+            for number in range(options.posts)
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=author, text=f"Комментарий {number}")
+            for number in range(20)
+        )
+        urls = [
+            reverse("index"),
+            reverse("profile", args=["bench"]),
+            reverse("post", args=["bench", post.id]),
+        ]
+        without = [name for name in settings.MIDDLEWARE if name != METRICS]
+        clients = {}
+        for label, middleware in (("без метрик", without),
+                                  ("с метриками", [METRICS] + without)):
+            # цепочка middleware клиента собирается при первом запросе
+            with override_settings(MIDDLEWARE=middleware):
+                clients[label] = Client()
+                for url in urls:
+                    clients[label].get(url)
+        results = {key: [] for key in
+                   ((label, url) for label in clients for url in urls)}
+        # запросы чередуются, чтобы дрейф машины делился поровну
+        for _ in range(options.repeat):
+            for url in urls:
+                for label, client in clients.items():
+                    results[label, url] += measure(lambda: client.get(url), 1)
+        for url in urls:
+            print(f"\n{url}")
+            base = results["без метрик", url]
+            measured = results["с метриками", url]
+            print_row("без метрик", base)
+            print_row("с метриками", measured)
+            overhead = statistics.median(measured) - statistics.median(base)
+            print(
+                f"разница медиан: {overhead * 1e6:.0f} мкс "
+                f"({overhead / statistics.median(base):+.1%})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Сравнение поиска FTS5 с прежним поиском через icontains.
+
+    python -m benchmarks.bench_search --posts 1000000
+
+Генерирует корпус постов из русских слов в разных формах, строит
+индекс FTS5 и замеряет первую страницу выдачи (COUNT + 10 постов)
+обоими способами.
+"""
+import random
+
+from benchmarks.common import (
+    measure, parser, print_row, setup_django, temporary_database, timer
+)
+from benchmarks.corpus import QUERIES, words
+
+
+def generate(total, seed):
+    from posts.models import Post, User
+
+    rng = random.Random(seed)
+    author = User.objects.create_user(username="bench")
+    batch = []
+    for _ in range(total):
+        batch.append(Post(text=words(rng, rng.randint(20, 60)), author=author))
+        if len(batch) == 5000:
+            Post.objects.bulk_create(batch)
+            batch = []
+    Post.objects.bulk_create(batch)
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--posts", type=int, default=100000)
+    args.add_argument("--repeat", type=int, default=20)
+    args.add_argument("--seed", type=int, default=1)
+    options = args.parse_args()
+
+    setup_django()
+    from django.core.paginator import Paginator
+    from posts import search
+    from posts.models import Post
+
+    with temporary_database():
+        with timer(f"Генерация {options.posts} постов"):
+            generate(options.posts, options.seed)
+        with timer("Построение индекса FTS5"):
+            search.rebuild()
+
+        for query in QUERIES:
+            def fts():
+                page = Paginator(search.search(query), 10).get_page(1)
+                list(page)
+
+            def icontains():
+                posts = Post.objects.for_feed().filter(text__icontains=query)
+                list(Paginator(posts, 10).get_page(1))
+
+            print(f"\nЗапрос: {query!r}")
+            print_row("FTS5 + bm25", measure(fts, options.repeat))
+            print_row("icontains", measure(icontains, options.repeat))
+
+
+if __name__ == "__main__":
+    main()
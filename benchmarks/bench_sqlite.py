@@ -0,0 +1,144 @@
+"""Чтение под записью: стандартный SQLite против настроек yatube.sqlite.
+
+    python -m benchmarks.bench_sqlite --readers 8 --seconds 10
+
+--readers процессов читают страницы постов и профилей, пока ещё один
+процесс непрерывно публикует посты через new_post. База — временный файл
+SQLite. Прогон повторяется с настройками стандартного бэкенда (журнал
+отката, BEGIN DEFERRED) и с PRAGMAS бэкенда yatube.sqlite; печатаются
+задержки и пропускная способность чтения, число записей и ошибок.
+"""
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import (
+    parser, print_row, setup_django, temporary_database
+)
+
+CONFIGS = (
+    ("стандартный", {
+        "pragmas": {"journal_mode": "DELETE", "synchronous": "FULL"},
+        "transaction_mode": "DEFERRED",
+    }),
+    ("yatube.sqlite", {"transaction_mode": "IMMEDIATE"}),
+)
+
+
+def reader(urls, stop, results):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    rng = random.Random()
+    samples, errors = [], []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            client.get(rng.choice(urls))
+        except Exception as error:
+            errors.append(type(error).__name__)
+        samples.append(time.perf_counter() - started)
+    connection.close()
+    results.put((samples, 0, errors))
+
+
+def writer(user, stop, results):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.force_login(user)
+    writes, errors = 0, []
+    while not stop.is_set():
+        try:
+            client.post(reverse("new_post"), {"text": "Новый пост"})
+            writes += 1
+        except Exception as error:
+            errors.append(type(error).__name__)
+    connection.close()
+    results.put(([], writes, errors))
+
+
+def run(urls, user, readers, seconds):
+    """Процессы-читатели и процесс-писатель, как воркеры сервера"""
+    from django.db import connection
+
+    context = multiprocessing.get_context("fork")
+    stop = context.Event()
+    results = context.Queue()
+    # соединение родителя не должно попасть в дочерние процессы
+    connection.close()
+    processes = [
+        context.Process(target=writer, args=[user, stop, results])
+    ] + [
+        context.Process(target=reader, args=[urls, stop, results])
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(seconds)
+    stop.set()
+    samples, writes, errors = [], 0, []
+    for _ in processes:
+        process_samples, process_writes, process_errors = results.get()
+        samples += process_samples
+        writes += process_writes
+        errors += process_errors
+    for process in processes:
+        process.join()
+    return samples, writes, errors
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--readers", type=int, default=8)
+    args.add_argument("--seconds", type=float, default=10)
+    args.add_argument("--posts", type=int, default=2000)
+    options = args.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from posts.models import Post, User
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.settings_dict["TEST"]["NAME"] = path
+    with temporary_database(), override_settings(
+        ALLOWED_HOSTS=["*"], NPLUSONE_MODE="off", WRITE_BEHIND=False
+    ):
+        authors = [
+            User.objects.create_user(username=f"author{number}")
+            for number in range(20)
+        ]
+        Post.objects.bulk_create(
+            Post(text=f"Пост {number}", author=authors[number % 20])
+            for number in range(options.posts)
+        )
+        post_ids = list(Post.objects.values_list("id", "author__username"))
+        urls = [
+            reverse("post", args=[username, post_id])
+            for post_id, username in post_ids[:200]
+        ] + [reverse("profile", args=[author.username]) for author in authors]
+        user = User.objects.create_user(username="writer")
+        options_dict = connection.settings_dict["OPTIONS"]
+        for label, config in CONFIGS:
+            options_dict.clear()
+            options_dict.update(config)
+            samples, writes, errors = run(
+                urls, user, options.readers, options.seconds
+            )
+            print_row(f"{label}: чтение", samples)
+            print(
+                f"{'':<40} чтений {len(samples) / options.seconds:.0f}/с, "
+                f"постов {writes / options.seconds:.0f}/с, "
+                f"ошибок {len(errors)} {sorted(set(errors))}"
+            )
+
+
+if __name__ == "__main__":
+    main()
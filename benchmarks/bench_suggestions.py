@@ -0,0 +1,69 @@
+"""Пакетный расчёт рекомендаций «кого читать» на большом графе подписок.
+
+    python -m benchmarks.bench_suggestions --users 100000 --follows 20
+
+Граф создаётся сырыми INSERT во временной базе: у каждого пользователя
+--follows подписок, популярность авторов — по степенному закону, как в
+benchmarks/dataset.py. Печатается время загрузки графа в массивы, расчёта
+с записью рекомендаций (последовательно и в --workers процессах) и
+скорость в подписках в секунду.
+"""
+import random
+import time
+
+from benchmarks.common import parser, setup_django, temporary_database, timer
+from benchmarks.dataset import PowerLaw
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--users", type=int, default=100000)
+    args.add_argument("--follows", type=int, default=20)
+    args.add_argument("--alpha", type=float, default=1.1)
+    args.add_argument("--workers", type=int, default=4)
+    args.add_argument("--seed", type=int, default=1)
+    options = args.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from posts import suggestions
+    from posts.models import Follow, Suggestion, User
+
+    rng = random.Random(options.seed)
+    with temporary_database():
+        with timer("Генерация графа"):
+            User.objects.bulk_create(
+                User(username=f"user{number}")
+                for number in range(options.users)
+            )
+            ids = list(User.objects.values_list("id", flat=True))
+            authors = PowerLaw(rng, rng.sample(ids, len(ids)), options.alpha)
+            with connection.cursor() as cursor:
+                for user in ids:
+                    followed = set(authors(options.follows)) - {user}
+                    cursor.executemany(
+                        f"INSERT INTO {Follow._meta.db_table} "
+                        "(user_id, author_id) VALUES (%s, %s)",
+                        [(user, author) for author in followed],
+                    )
+        edges = Follow.objects.count()
+        print(f"подписок: {edges}, пользователей: {len(ids)}")
+
+        started = time.perf_counter()
+        suggestions.load_graph()
+        seconds = time.perf_counter() - started
+        print(f"загрузка графа: {seconds:.1f} s ({edges / seconds:,.0f}/с)")
+        for workers in sorted({1, options.workers}):
+            started = time.perf_counter()
+            total = suggestions.build(workers=workers)
+            seconds = time.perf_counter() - started
+            print(
+                f"расчёт, процессов {workers}: {seconds:.1f} s "
+                f"({edges / seconds:,.0f} подписок/с), "
+                f"рекомендаций {total}"
+            )
+        print(f"строк Suggestion: {Suggestion.objects.count()}")
+
+
+if __name__ == "__main__":
+    main()
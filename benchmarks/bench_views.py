@@ -0,0 +1,210 @@
+"""Нагрузочный прогон публичных страниц с сохранением результатов.
+
+    python -m benchmarks.bench_views --requests 300 --output before.json
+    python -m benchmarks.bench_views --requests 300 --compare before.json
+
+Данные создаются генератором benchmarks/dataset.py во временной базе.
+Каждый сценарий делает --requests запросов тестовым клиентом (весь
+стек middleware, без сети) и считает задержку p50/p95/p99, число
+SQL-запросов на запрос и пропускную способность в один поток. Адреса
+выбираются по степенному закону: первые страницы, популярные группы и
+авторы запрашиваются чаще. Пишущие сценарии идут последними.
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<коммит>.json);
+--compare печатает изменение относительно сохранённого прогона.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from benchmarks import dataset
+from benchmarks.common import (
+    ROOT, parser, setup_django, summary, temporary_database, timer
+)
+from benchmarks.corpus import QUERIES, words
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+class Scenarios:
+    """Сценарии: метод возвращает ответ на один запрос"""
+
+    def __init__(self, data, rng, alpha):
+        from django.test import Client
+        from posts.models import Group, User
+
+        self.rng = rng
+        self.posts = dataset.PowerLaw(rng, data["posts"], alpha)
+        self.pages = dataset.PowerLaw(rng, range(1, 51), alpha)
+        self.groups = dataset.PowerLaw(rng, data["groups"], alpha)
+        self.authors = dataset.PowerLaw(rng, data["usernames"], alpha)
+        self.group_ids = dict(Group.objects.values_list("slug", "id"))
+        self.anonymous = Client()
+        self.clients = []
+        # выборка через rng, а не ORDER BY RANDOM(): тот же --seed даёт
+        # тех же пользователей
+        user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+        sample = self.rng.sample(user_ids, min(20, len(user_ids)))
+        users = User.objects.in_bulk(sample)
+        for user_id in sample:
+            client = Client()
+            client.force_login(users[user_id])
+            self.clients.append(client)
+
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    def index(self):
+        return self.anonymous.get("/", {"page": self.pages.one()})
+
+    def hot_index(self):
+        return self.anonymous.get("/hot/", {"page": self.rng.randint(1, 10)})
+
+    def group_posts(self):
+        return self.anonymous.get(
+            f"/group/{self.groups.one()}/", {"page": self.pages.one()}
+        )
+
+    def profile(self):
+        return self.anonymous.get(f"/{self.authors.one()}/")
+
+    def post_view(self):
+        post_id, username = self.posts.one()
+        return self.anonymous.get(f"/{username}/{post_id}/")
+
+    def follow_index(self):
+        return self.client().get("/follow/", {"page": self.pages.one()})
+
+    def search(self):
+        return self.anonymous.get("/search/", {"q": self.rng.choice(QUERIES)})
+
+    def new_post(self):
+        return self.client().post("/new/", {
+            "text": words(self.rng, 30),
+            "group": self.group_ids[self.groups.one()],
+        })
+
+    def add_comment(self):
+        post_id, username = self.posts.one()
+        return self.client().post(
+            f"/{username}/{post_id}/comment", {"text": words(self.rng, 10)}
+        )
+
+
+READS = (
+    "index", "hot_index", "group_posts", "profile", "post_view",
+    "follow_index", "search",
+)
+WRITES = ("new_post", "add_comment")
+
+
+def run_scenario(call, requests):
+    from django.db import connection
+
+    queries = []
+    samples = []
+
+    def count(execute, sql, params, many, context):
+        queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        for _ in range(requests):
+            queries.append(0)
+            started = time.perf_counter()
+            response = call()
+            samples.append(time.perf_counter() - started)
+            assert response.status_code in (200, 302), response.status_code
+    result = summary(samples)
+    result["rps"] = len(samples) / sum(samples)
+    result["queries"] = sum(queries) / len(queries)
+    result["max_queries"] = max(queries)
+    return result
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results, baseline=None):
+    for name, stats in results.items():
+        line = (
+            f"{name:<14} p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} "
+            f"ms  p99 {stats['p99']:8.2f} ms  {stats['rps']:7.1f} запр/с  "
+            f"{stats['queries']:5.1f} SQL"
+        )
+        old = (baseline or {}).get(name)
+        if old:
+            line += (
+                f"  | p50 {stats['p50'] / old['p50'] - 1:+.0%}"
+                f"  запр/с {stats['rps'] / old['rps'] - 1:+.0%}"
+                f"  SQL {stats['queries'] - old['queries']:+.1f}"
+            )
+        print(line)
+
+
+def main():
+    args = parser(__doc__)
+    dataset.add_arguments(args)
+    args.add_argument("--requests", type=int, default=200)
+    args.add_argument(
+        "--scenarios", nargs="*", choices=READS + WRITES,
+        default=list(READS + WRITES),
+    )
+    args.add_argument("--output", help="Файл результатов JSON")
+    args.add_argument("--compare", help="Результаты прошлого прогона")
+    options = args.parse_args()
+
+    setup_django()
+    import django
+    from django.test.utils import override_settings
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as stream:
+            baseline = json.load(stream)["scenarios"]
+    params = {name: getattr(options, name) for name in dataset.DEFAULTS}
+    params["seed"] = options.seed
+    with temporary_database(), override_settings(
+        ALLOWED_HOSTS=["*"], THUMBNAIL_ASYNC=False, NPLUSONE_MODE="off"
+    ):
+        with timer("Генерация данных"):
+            data = dataset.generate(params)
+        scenarios = Scenarios(data, random.Random(options.seed), options.alpha)
+        ordered = [name for name in READS + WRITES
+                   if name in options.scenarios]
+        results = {
+            name: run_scenario(getattr(scenarios, name), options.requests)
+            for name in ordered
+        }
+    print_results(results, baseline)
+
+    report = {
+        "commit": commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "dataset": params,
+        "requests": options.requests,
+        "scenarios": results,
+    }
+    output = options.output or os.path.join(
+        RESULTS_DIR, f"{report['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as stream:
+        json.dump(report, stream, indent=2, ensure_ascii=False)
+    print(f"\nРезультаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
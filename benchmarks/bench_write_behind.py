@@ -0,0 +1,92 @@
+"""Всплеск комментариев: одиночные INSERT против групповой записи.
+
+    python -m benchmarks.bench_write_behind --threads 16 --requests 50
+
+--threads потоков одновременно отправляют по --requests комментариев
+через тестовый клиент (весь стек view и middleware). База — временный
+файл SQLite, как в работе: потоки соперничают за его блокировку.
+Печатаются задержки, пропускная способность и число ошибок.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.common import (
+    parser, print_row, setup_django, temporary_database
+)
+
+
+def burst(post, users, requests):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    url = reverse("add_comment", args=[post.author.username, post.id])
+    barrier = threading.Barrier(len(users))
+    samples, errors = [], []
+
+    def client_thread(user):
+        client = Client()
+        client.force_login(user)
+        barrier.wait()
+        try:
+            for number in range(requests):
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, {"text": f"Ответ {number}"})
+                    if response.status_code != 302:
+                        errors.append(response.status_code)
+                except Exception as error:
+                    errors.append(type(error).__name__)
+                samples.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=client_thread, args=[user]) for user in users
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument("--threads", type=int, default=16)
+    args.add_argument("--requests", type=int, default=50)
+    options = args.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import override_settings
+    from posts.models import Comment, Post, User
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.settings_dict["TEST"]["NAME"] = path
+    with temporary_database(), override_settings(
+        ALLOWED_HOSTS=["*"], NPLUSONE_MODE="off"
+    ):
+        author = User.objects.create_user(username="author")
+        post = Post.objects.create(text="Пост", author=author)
+        users = [
+            User.objects.create_user(username=f"reader{number}")
+            for number in range(options.threads)
+        ]
+        connection.close()
+        for label, enabled in (("по одному", False), ("пачками", True)):
+            with override_settings(WRITE_BEHIND=enabled):
+                samples, errors, seconds = burst(post, users, options.requests)
+            print_row(label, samples)
+            print(
+                f"{'':<40} {len(samples) / seconds:.0f} запр/с, "
+                f"ошибок: {len(errors)} {sorted(set(errors))}"
+            )
+        print(f"комментариев записано: {Comment.objects.count()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Общие инструменты бенчмарков: Django, временная база, замеры.
+
+Бенчмарки запускаются из корня проекта как модули, например
+``python -m benchmarks.bench_search --posts 1000000``. Данные
+создаются во временной тестовой базе, рабочая db.sqlite3 не трогается.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+    import django
+    django.setup()
+
+
+@contextmanager
+def temporary_database():
+    """Тестовая база с применёнными миграциями на время замера"""
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment, teardown_test_environment
+    )
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def parser(description):
+    return argparse.ArgumentParser(description=description)
+
+
+def measure(func, repeat):
+    """Время каждого из repeat вызовов func, в секундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summary(samples):
+    """p50/p95/p99 и среднее в миллисекундах"""
+    return {
+        "p50": percentile(samples, 50) * 1000,
+        "p95": percentile(samples, 95) * 1000,
+        "p99": percentile(samples, 99) * 1000,
+        "mean": statistics.mean(samples) * 1000,
+    }
+
+
+def print_row(name, samples):
+    stats = summary(samples)
+    print(
+        f"{name:<40} p50 {stats['p50']:9.2f} ms  p95 {stats['p95']:9.2f} ms"
+        f"  p99 {stats['p99']:9.2f} ms"
+    )
+
+
+@contextmanager
+def timer(label):
+    started = time.perf_counter()
+    yield
+    print(f"{label}: {time.perf_counter() - started:.1f} s")
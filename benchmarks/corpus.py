@@ -0,0 +1,16 @@
+"""Общий словарь бенчмарков: русские слова в разных формах для текстов
+постов, групп и комментариев и поисковые запросы по ним."""
+
+STEMS = (
+    "утр", "вечер", "книг", "дорог", "работ", "город", "друг", "мысл",
+    "солнц", "лес", "рек", "гор", "письм", "окн", "дом", "стол", "дел",
+    "врем", "жизн", "слов", "мест", "лиц", "рук", "глаз", "голос", "сил",
+)
+ENDINGS = ("", "а", "у", "ом", "е", "ы", "ами", "ах", "ой", "ам", "о", "и")
+QUERIES = ("утро", "дорогами", "книги письма", "солнце лес река", "абырвалг")
+
+
+def words(rng, count):
+    return " ".join(
+        rng.choice(STEMS) + rng.choice(ENDINGS) for _ in range(count)
+    )
@@ -0,0 +1,129 @@
+"""Генератор данных для бенчмарков: пользователи, группы, посты,
+комментарии и граф подписок.
+
+Популярность авторов, постов и групп распределена по степенному закону
+(вес ранга r — 1 / (r + 1) ** alpha): немногие авторы пишут и собирают
+подписчиков больше всех, как в живой сети. Одинаковые параметры и seed
+дают одинаковые данные. Посты, комментарии и подписки загружаются через
+posts/importer.py, поэтому счётчики, поиск и ленты заполняются так же,
+как при обычном импорте.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from benchmarks.corpus import words
+
+DEFAULTS = {
+    "users": 1000,
+    "groups": 20,
+    "posts": 20000,
+    "comments": 50000,
+    "follows": 20,
+    "alpha": 1.1,
+    "days": 365,
+}
+
+
+class PowerLaw:
+    """Случайный выбор из population с весами 1 / (ранг + 1) ** alpha"""
+
+    def __init__(self, rng, population, alpha):
+        self.rng = rng
+        self.population = list(population)
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** alpha for rank in range(len(self.population))
+        ))
+
+    def __call__(self, k=1):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+    def one(self):
+        return self(1)[0]
+
+
+def add_arguments(parser):
+    for name, default in DEFAULTS.items():
+        parser.add_argument(
+            f"--{name}", type=type(default), default=default
+        )
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def generate(options, batch_size=2000):
+    """Заполнить базу; вернуть описание данных для сценариев"""
+    from django.utils import timezone
+    from posts.importer import Importer
+    from posts.models import Group, Post, User, UserStats
+
+    rng = random.Random(options["seed"])
+    alpha = options["alpha"]
+    usernames = [f"user{number}" for number in range(options["users"])]
+    User.objects.bulk_create(User(username=name) for name in usernames)
+    UserStats.objects.bulk_create(
+        UserStats(user_id=pk)
+        for pk in User.objects.values_list("pk", flat=True)
+    )
+    slugs = [f"group{number}" for number in range(options["groups"])]
+    Group.objects.bulk_create(
+        Group(title=f"Группа {slug}", slug=slug, description=words(rng, 10))
+        for slug in slugs
+    )
+    # ранги популярности не совпадают с порядком создания
+    authors = PowerLaw(rng, rng.sample(usernames, len(usernames)), alpha)
+    groups = PowerLaw(rng, [None] + slugs, alpha)
+    now = timezone.now()
+    span = options["days"] * 86400
+
+    def posts():
+        for number in range(options["posts"]):
+            yield number, {
+                "author": authors.one(),
+                "text": words(rng, rng.randint(10, 80)),
+                "group": groups.one(),
+                "pub_date": (
+                    now - timedelta(seconds=rng.uniform(0, span))
+                ).isoformat(),
+            }
+
+    Importer("posts").run(posts(), batch_size)
+    post_ids = list(Post.objects.order_by("-pub_date").values_list(
+        "id", flat=True
+    ))
+    # новые посты комментируют чаще
+    popular_posts = PowerLaw(rng, post_ids, alpha)
+    commenters = PowerLaw(rng, rng.sample(usernames, len(usernames)), alpha)
+
+    def comments():
+        for number in range(options["comments"]):
+            yield number, {
+                "post": popular_posts.one(),
+                "author": commenters.one(),
+                "text": words(rng, rng.randint(3, 30)),
+            }
+
+    Importer("comments").run(comments(), batch_size)
+
+    def follows():
+        # число подписчиков автора распределено по степенному закону
+        total = options["users"] * options["follows"]
+        for number in range(total):
+            yield number, {
+                "user": rng.choice(usernames),
+                "author": authors.one(),
+            }
+
+    Importer("follows").run(
+        ((number, record) for number, record in follows()
+         if record["user"] != record["author"]),
+        batch_size,
+    )
+    return {
+        "usernames": usernames,
+        "groups": slugs,
+        "posts": list(Post.objects.order_by("-pub_date").values_list(
+            "id", "author__username"
+        )),
+    }
@@ -0,0 +1,149 @@
+"""JSON API лент для мобильного клиента.
+
+Ответы собираются из словарей, без шаблонов. Списки постов листаются
+курсором (``?cursor=``, ``next_cursor`` в ответе). У каждого ответа есть
+сильный ETag: для списка — по id и версиям постов страницы (новый пост
+сдвигает первую страницу, правка или комментарий меняют версию), для
+поста — по его версии. Клиент присылает его в If-None-Match и, если
+ничего не поменялось, получает пустой ответ 304 — без сериализации, а
+для поста и без запроса комментариев.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from .feed import follow_feed
+from .models import Group, Post, User
+from .paginator import CursorPaginator
+
+PER_PAGE = 20
+COMMENTS_PER_PAGE = 50
+COMMENTS_ORDERING = ("created", "id")
+
+
+def make_etag(*parts):
+    data = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(data.encode()).hexdigest() + '"'
+
+
+def conditional(request, etag, build):
+    """304, если у клиента актуальная версия, иначе JSON из build()"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build())
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def post_data(post):
+    return {
+        "id": post.id,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "author": post.author.username,
+        "group": post.group and {
+            "slug": post.group.slug, "title": post.group.title
+        },
+        "image": post.image.url if post.image else None,
+        "thumbnail": post.thumbnail or None,
+        "comment_count": post.comment_count,
+        "version": post.version,
+        "url": reverse("api_post", args=[post.id]),
+    }
+
+
+def comment_data(comment):
+    return {
+        "id": comment.id,
+        "author": comment.author.username,
+        "profile_url": reverse("profile", args=[comment.author.username]),
+        "text": comment.text,
+        "created": comment.created.isoformat(),
+    }
+
+
+def post_list(request, posts):
+    page = CursorPaginator(posts.for_feed(), PER_PAGE).get_page(
+        request.GET.get("cursor")
+    )
+    etag = make_etag(
+        request.GET.get("cursor", ""),
+        page.has_next(),
+        *(f"{post.id}.{post.version}" for post in page),
+    )
+    return conditional(request, etag, lambda: {
+        "results": [post_data(post) for post in page],
+        "next_cursor": page.next_cursor,
+        "previous_cursor": page.previous_cursor,
+    })
+
+
+def comment_page(post, cursor):
+    return CursorPaginator(
+        post.comments.select_related("author"),
+        COMMENTS_PER_PAGE,
+        COMMENTS_ORDERING,
+    ).get_page(cursor)
+
+
+@require_GET
+def index(request):
+    return post_list(request, Post.objects.all())
+
+
+@require_GET
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return post_list(request, group.posts.all())
+
+
+@require_GET
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return post_list(request, author.posts.all())
+
+
+@require_GET
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"detail": "Нужно войти"}, status=401)
+    return post_list(request, follow_feed(request.user))
+
+
+@require_GET
+def post_detail(request, post_id):
+    """Пост с первой порцией комментариев"""
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
+
+    def build():
+        comments = comment_page(post, None)
+        return {
+            **post_data(post),
+            "comments": [comment_data(comment) for comment in comments],
+            "comments_next_cursor": comments.next_cursor,
+        }
+
+    return conditional(request, make_etag(post.id, post.version), build)
+
+
+@require_GET
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста"""
+    post = get_object_or_404(Post, id=post_id)
+    cursor = request.GET.get("cursor")
+
+    def build():
+        comments = comment_page(post, cursor)
+        return {
+            "results": [comment_data(comment) for comment in comments],
+            "next_cursor": comments.next_cursor,
+        }
+
+    return conditional(
+        request, make_etag(post.id, post.version, cursor or ""), build
+    )
@@ -0,0 +1,47 @@
+"""Кеш отрисованных карточек постов.
+
+Карточка (includes/post_card.html) рисуется один раз и переиспользуется
+во всех лентах. Ключ содержит Post.version, которую увеличивают правка
+поста, новый или удалённый комментарий и переименование группы, —
+поэтому инвалидация не требует удаления ключей. Ссылка «Редактировать»
+зависит от зрителя, поэтому в кеш попадает только метка на её месте,
+а сама ссылка подставляется при выводе.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import format_html
+
+CARD_TIMEOUT = 60 * 60 * 24
+EDIT_MARKER = "<!--post-edit-->"
+
+
+def card_key(post):
+    # pub_date защищает от совпадения id у удалённого и нового поста
+    return f"post-card:{post.id}:{post.version}:{post.pub_date.timestamp()}"
+
+
+def render_card(post):
+    """HTML карточки поста, общий для всех зрителей"""
+    key = card_key(post)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string("includes/post_card.html", {"post": post})
+        cache.set(key, html, CARD_TIMEOUT)
+    return html
+
+
+def edit_link(post):
+    url = reverse("post_edit", args=[post.author.username, post.id])
+    return format_html(
+        '<a class="btn btn-sm text-muted" href="{}" role="button">'
+        "Редактировать</a>",
+        url,
+    )
+
+
+def personalize(html, post, user):
+    """Подставить ссылку на редактирование, если зритель — автор"""
+    is_author = getattr(user, "pk", None) == post.author_id
+    link = edit_link(post) if is_author else ""
+    return html.replace(EDIT_MARKER, link)
@@ -0,0 +1,250 @@
+"""Денормализованные счётчики: подписчики, подписки, посты, комментарии,
+счётчики групп (посты, авторы, время последнего поста).
+
+Счётчики меняются атомарно через F()-выражения из сигналов (см.
+posts/signals.py), поэтому параллельные запросы не теряют приращения.
+Расхождения, если они всё же накопятся, исправляет команда
+``manage.py reconcile_counters``.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import (
+    Count, DateTimeField, F, Max, OuterRef, Subquery, Value
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from . import feed
+from .models import (
+    Comment, Follow, Group, GroupStats, Post, User, UserStats
+)
+
+BATCH_SIZE = 500
+
+
+def _count(queryset, field):
+    """Коррелированный подзапрос с количеством строк для OuterRef("pk")"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def actual_user_stats(user_ids=None):
+    """Счётчики пользователей, посчитанные по исходным таблицам"""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    return users.annotate(
+        actual_followers=_count(Follow.objects.all(), "author"),
+        actual_following=_count(Follow.objects.all(), "user"),
+        actual_posts=_count(Post.objects.all(), "author"),
+    ).values_list(
+        "pk", "actual_followers", "actual_following", "actual_posts"
+    )
+
+
+def reconcile_user(user_id):
+    """Пересчитать счётчики одного пользователя"""
+    for pk, followers, following, posts in actual_user_stats([user_id]):
+        UserStats.objects.update_or_create(
+            user_id=pk,
+            defaults={
+                "followers": followers,
+                "following": following,
+                "posts": posts,
+            },
+        )
+
+
+def bump(user_id, **deltas):
+    """Атомарно изменить счётчики пользователя на заданные величины"""
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+    if not updated and min(deltas.values()) > 0:
+        # строки ещё нет: считаем с нуля, изменение уже в исходных таблицах.
+        # При уменьшении строку не создаём — это может быть удаление
+        # самого пользователя, а get_stats() и так посчитает её при чтении
+        reconcile_user(user_id)
+
+
+def _by_delta(deltas):
+    """{id: изменение} → {изменение: [id, ...]} пачками по BATCH_SIZE:
+    одинаковые изменения применяются одним UPDATE"""
+    groups = defaultdict(list)
+    for pk, delta in deltas.items():
+        groups[delta].append(pk)
+    for delta, pks in groups.items():
+        for start in range(0, len(pks), BATCH_SIZE):
+            yield delta, pks[start:start + BATCH_SIZE]
+
+
+def bump_many(name, deltas):
+    """bump() для многих пользователей сразу: {user_id: изменение}"""
+    for delta, user_ids in _by_delta(deltas):
+        existing = set(UserStats.objects.filter(
+            user_id__in=user_ids
+        ).values_list("user_id", flat=True))
+        UserStats.objects.filter(user_id__in=existing).update(
+            **{name: F(name) + delta}
+        )
+        if delta > 0:
+            for user_id in set(user_ids) - existing:
+                reconcile_user(user_id)
+
+
+def bump_comments_many(deltas):
+    """bump_comments() для многих постов сразу: {post_id: изменение}"""
+    for delta, post_ids in _by_delta(deltas):
+        Post.objects.filter(pk__in=post_ids).update(
+            comment_count=F("comment_count") + delta,
+            version=F("version") + 1,
+        )
+
+
+def bump_comments(post_id, delta, **changes):
+    """Изменить число комментариев; карточка поста при этом устаревает.
+    changes — другие поля поста, которые обновляются тем же запросом"""
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F("comment_count") + delta,
+        version=F("version") + 1,
+        **changes,
+    )
+
+
+def get_stats(user):
+    """Счётчики профиля; строка создаётся при первом обращении"""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        reconcile_user(user.pk)
+        return UserStats.objects.get(user_id=user.pk)
+
+
+def actual_group_stats(group_ids=None):
+    """Счётчики групп, посчитанные по таблице постов"""
+    groups = Group.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    return groups.annotate(
+        actual_posts=Count("posts"),
+        actual_authors=Count("posts__author", distinct=True),
+        actual_last_post_at=Max("posts__pub_date"),
+    ).values_list(
+        "pk", "actual_posts", "actual_authors", "actual_last_post_at"
+    )
+
+
+def reconcile_group(group_id):
+    """Пересчитать счётчики одной группы"""
+    for pk, posts, authors, last_post_at in actual_group_stats([group_id]):
+        GroupStats.objects.update_or_create(
+            group_id=pk,
+            defaults={
+                "posts": posts,
+                "authors": authors,
+                "last_post_at": last_post_at,
+            },
+        )
+
+
+def bump_groups(posts, sign=1):
+    """Учесть посты, которые уже добавлены в свои группы (sign=1) или
+    уже убраны из них (sign=-1): удалены или перенесены в другую группу.
+
+    На группу — запрос числа оставшихся постов затронутых авторов (по
+    нему видно, появился ли в группе новый автор или ушёл последний
+    пост автора) и один UPDATE."""
+    by_group = defaultdict(Counter)
+    latest = {}
+    for post in posts:
+        if post.group_id is None:
+            continue
+        by_group[post.group_id][post.author_id] += 1
+        latest[post.group_id] = max(
+            latest.get(post.group_id, post.pub_date), post.pub_date
+        )
+    for group_id, authors in by_group.items():
+        remaining = dict(Post.objects.filter(
+            group_id=group_id, author_id__in=authors
+        ).order_by().values("author_id").annotate(
+            count=Count("pk")
+        ).values_list("author_id", "count"))
+        if sign > 0:
+            # автор новый, если все его посты в группе — только что добавленные
+            changes = {
+                "posts": F("posts") + sum(authors.values()),
+                "authors": F("authors") + sum(
+                    remaining.get(author_id, 0) == count
+                    for author_id, count in authors.items()
+                ),
+                "last_post_at": Greatest(
+                    Coalesce("last_post_at", Value(latest[group_id])),
+                    Value(latest[group_id]),
+                    output_field=DateTimeField(),
+                ),
+            }
+        else:
+            changes = {
+                "posts": F("posts") - sum(authors.values()),
+                "authors": F("authors") - sum(
+                    author_id not in remaining for author_id in authors
+                ),
+                "last_post_at": Subquery(Post.objects.filter(
+                    group_id=group_id
+                ).order_by("-pub_date").values("pub_date")[:1]),
+            }
+        if not GroupStats.objects.filter(group_id=group_id).update(**changes):
+            # строки ещё нет: считаем с нуля по уже изменённой таблице
+            reconcile_group(group_id)
+
+
+def get_group_stats(group):
+    """Счётчики группы; строка создаётся при первом обращении"""
+    try:
+        return group.stats
+    except GroupStats.DoesNotExist:
+        reconcile_group(group.pk)
+        return GroupStats.objects.get(group_id=group.pk)
+
+
+def reconcile():
+    """Исправить все разошедшиеся счётчики, вернуть число исправлений"""
+    fixed = 0
+    stored = dict(
+        (pk, (followers, following, posts))
+        for pk, followers, following, posts in UserStats.objects.values_list(
+            "user_id", "followers", "following", "posts"
+        ).iterator()
+    )
+    users = []
+    for pk, *actual in actual_user_stats().iterator():
+        if stored.get(pk) != tuple(actual):
+            reconcile_user(pk)
+            users.append(pk)
+    # число подписчиков могло перейти порог раскладки лент
+    feed.update_celebrities(users)
+    fixed += len(users)
+    drifted = Post.objects.annotate(
+        actual=_count(Comment.objects.all(), "post")
+    ).exclude(comment_count=F("actual")).values_list("pk", "actual")
+    for pk, actual in drifted.iterator():
+        Post.objects.filter(pk=pk).update(comment_count=actual)
+        fixed += 1
+    stored = dict(
+        (pk, (posts, authors, last_post_at))
+        for pk, posts, authors, last_post_at in GroupStats.objects.values_list(
+            "group_id", "posts", "authors", "last_post_at"
+        ).iterator()
+    )
+    for pk, *actual in actual_group_stats().iterator():
+        if stored.get(pk) != tuple(actual):
+            reconcile_group(pk)
+            fixed += 1
+    return fixed
@@ -0,0 +1,116 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Строки читаются через ``iterator(chunk_size=...)`` (на PostgreSQL — серверным
+курсором) в виде кортежей values_list, без создания моделей, и сразу
+пишутся в файл, поэтому память не зависит от размера таблицы.
+
+* JSONL — записи в формате posts/importer.py: выгрузку можно загрузить
+  обратно командой import_content. Сжатие gzip, bz2 или xz выбирается
+  по расширению файла.
+* Parquet — колоночный файл с типами для аналитики; нужен пакет
+  pyarrow. Каждая пачка строк пишется отдельной группой строк.
+"""
+import bz2
+import gzip
+import json
+import lzma
+from itertools import islice
+
+from .models import Comment, Follow, Post
+
+CHUNK_SIZE = 10000
+KINDS = ("posts", "comments", "follows")
+
+# поля выгрузки: (имя, поле для values_list, тип Parquet)
+COLUMNS = {
+    "posts": [
+        ("id", "id", "int64"),
+        ("author", "author__username", "string"),
+        ("group", "group__slug", "string"),
+        ("text", "text", "string"),
+        ("pub_date", "pub_date", "timestamp"),
+    ],
+    "comments": [
+        ("id", "id", "int64"),
+        ("post", "post_id", "int64"),
+        ("author", "author__username", "string"),
+        ("text", "text", "string"),
+        ("created", "created", "timestamp"),
+    ],
+    "follows": [
+        ("user", "user__username", "string"),
+        ("author", "author__username", "string"),
+    ],
+}
+MODELS = {"posts": Post, "comments": Comment, "follows": Follow}
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def rows(kind, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки кортежами, в порядке id"""
+    fields = [field for _, field, _ in COLUMNS[kind]]
+    return MODELS[kind].objects.order_by("id").values_list(
+        *fields
+    ).iterator(chunk_size=chunk_size)
+
+
+def open_output(path):
+    """Файл для записи текста; сжатие — по расширению"""
+    for extension, opener in OPENERS.items():
+        if path.endswith(extension):
+            return opener(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def _jsonable(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def write_jsonl(kind, stream, chunk_size=CHUNK_SIZE, progress=None):
+    """Выгрузить записи в JSONL, вернуть их количество"""
+    names = [name for name, _, _ in COLUMNS[kind]]
+    total = 0
+    for row in rows(kind, chunk_size):
+        record = {
+            name: _jsonable(value)
+            for name, value in zip(names, row) if value is not None
+        }
+        stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        total += 1
+        if progress is not None and total % chunk_size == 0:
+            progress(total)
+    return total
+
+
+def write_parquet(kind, path, chunk_size=CHUNK_SIZE, progress=None):
+    """Выгрузить записи в Parquet (нужен pyarrow), вернуть их количество"""
+    import pyarrow
+    import pyarrow.parquet
+
+    types = {
+        "int64": pyarrow.int64(),
+        "string": pyarrow.string(),
+        "timestamp": pyarrow.timestamp("us", tz="UTC"),
+    }
+    schema = pyarrow.schema(
+        [(name, types[type_name]) for name, _, type_name in COLUMNS[kind]]
+    )
+    source = rows(kind, chunk_size)
+    total = 0
+    with pyarrow.parquet.ParquetWriter(
+        path, schema, compression="zstd"
+    ) as writer:
+        while True:
+            chunk = list(islice(source, chunk_size))
+            if not chunk:
+                return total
+            writer.write_table(pyarrow.Table.from_arrays(
+                [
+                    pyarrow.array(column, type=field.type)
+                    for column, field in zip(zip(*chunk), schema)
+                ],
+                schema=schema,
+            ))
+            total += len(chunk)
+            if progress is not None:
+                progress(total)
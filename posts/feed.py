@@ -0,0 +1,213 @@
+"""Лента подписок: гибридный fan-out.
+
+Посты обычных авторов при публикации раскладываются во «входящие»
+подписчиков (FeedEntry), поэтому лента читается по индексу
+(user, -pub_date) без JOIN через Follow. Посты популярных авторов
+(UserStats.celebrity) не раскладываются — они подмешиваются в ленту при
+чтении (fan-out on read), чтобы один пост не порождал миллион вставок.
+
+Флаг celebrity меняется с гистерезисом: ставится, когда подписчиков
+больше FEED_FANOUT_MAX_FOLLOWERS, снимается, когда их меньше
+FEED_FANOUT_MIN_FOLLOWERS, — чтобы автор у порога не переключался туда и
+обратно. При снятии флага последние посты автора нужно разложить по
+лентам всех подписчиков, иначе посты «популярного» периода пропадут из
+лент. Это до FEED_FANOUT_MIN_FOLLOWERS × FEED_BACKFILL_POSTS вставок,
+поэтому работа идёт после фиксации транзакции в фоновом потоке
+(FEED_BACKFILL_ASYNC), а не в запросе отписки. Флаг снимает сама задача;
+если процесс завершится раньше, задачу поставит следующая проверка
+флага (подписка, отписка, ``manage.py reconcile_counters``).
+
+При подписке в ленту попадают только последние FEED_BACKFILL_POSTS
+постов автора, чтобы подписка на плодовитого автора не была
+неограниченной записью.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+FANOUT_MAX_FOLLOWERS = getattr(settings, "FEED_FANOUT_MAX_FOLLOWERS", 1000)
+FANOUT_MIN_FOLLOWERS = getattr(
+    settings, "FEED_FANOUT_MIN_FOLLOWERS", FANOUT_MAX_FOLLOWERS * 4 // 5
+)
+BACKFILL_POSTS = getattr(settings, "FEED_BACKFILL_POSTS", 200)
+BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def _bulk_insert(entries):
+    """Вставка записей ленты пачками, не собирая их все в память"""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Разложить новый пост по лентам подписчиков автора"""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Разложить пачку новых постов: подписчики всех авторов пачки
+    читаются одним запросом"""
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    celebrities = set(UserStats.objects.filter(
+        user_id__in=by_author, celebrity=True
+    ).values_list("user_id", flat=True))
+    follows = Follow.objects.filter(
+        author_id__in=set(by_author) - celebrities
+    ).values_list("author_id", "user_id")
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for author_id, user_id in follows.iterator()
+        for post in by_author[author_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту подписчика уже опубликованные посты автора"""
+    backfill_many([(user_id, author_id)])
+
+
+def backfill_many(pairs):
+    """backfill() для пачки подписок [(user_id, author_id), ...]: от
+    каждого автора читается не больше BACKFILL_POSTS последних постов
+    (LIMIT по индексу (author, -pub_date, -id))"""
+    followers = defaultdict(list)
+    for user_id, author_id in pairs:
+        followers[author_id].append(user_id)
+    celebrities = set(UserStats.objects.filter(
+        user_id__in=followers, celebrity=True
+    ).values_list("user_id", flat=True))
+
+    def entries():
+        for author_id in set(followers) - celebrities:
+            posts = Post.objects.filter(author_id=author_id).order_by(
+                "-pub_date", "-id"
+            ).values_list("id", "pub_date")[:BACKFILL_POSTS]
+            for post_id, pub_date in posts:
+                for user_id in followers[author_id]:
+                    yield FeedEntry(
+                        user_id=user_id, post_id=post_id, pub_date=pub_date
+                    )
+
+    _bulk_insert(entries())
+
+
+def update_celebrities(author_ids=None):
+    """Пересмотреть флаг celebrity авторов (по умолчанию всех): поставить
+    выше FANOUT_MAX_FOLLOWERS, а ниже FANOUT_MIN_FOLLOWERS поставить в
+    очередь снятие флага с раскладкой постов"""
+    stats = UserStats.objects.all()
+    if author_ids is not None:
+        stats = stats.filter(user_id__in=author_ids)
+    stats.filter(
+        celebrity=False, followers__gt=FANOUT_MAX_FOLLOWERS
+    ).update(celebrity=True)
+    for author_id in stats.filter(
+        celebrity=True, followers__lt=FANOUT_MIN_FOLLOWERS
+    ).values_list("user_id", flat=True):
+        schedule_demotion(author_id)
+
+
+def demote(author_id):
+    """Снять флаг celebrity и разложить последние посты автора по лентам
+    всех подписчиков; повторный вызов ничего не делает"""
+    demoted = UserStats.objects.filter(
+        user_id=author_id,
+        celebrity=True,
+        followers__lt=FANOUT_MIN_FOLLOWERS,
+    ).update(celebrity=False)
+    if not demoted:
+        return
+    # посты, опубликованные после снятия флага, раскладываются сами
+    backfill_many(
+        (user_id, author_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list("user_id", flat=True).iterator()
+    )
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="feed-backfill"
+        )
+    return _executor
+
+
+def _run_demotion(author_id):
+    close_old_connections()
+    try:
+        with transaction.atomic():
+            demote(author_id)
+    except Exception:
+        logger.exception("Не удалось разложить посты автора %s", author_id)
+    finally:
+        connection.close()
+
+
+def schedule_demotion(author_id):
+    """Снять флаг celebrity после фиксации транзакции, вне запроса"""
+    if not getattr(settings, "FEED_BACKFILL_ASYNC", True):
+        transaction.on_commit(lambda: demote(author_id))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run_demotion, author_id)
+    )
+
+
+def prune(user_id, author_id):
+    """Убрать посты автора из ленты отписавшегося пользователя"""
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Пересобрать ленту пользователя с нуля"""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(
+        user_id=user_id
+    ).values_list("author_id", flat=True)
+    for author_id in author_ids:
+        backfill(user_id, author_id)
+
+
+def celebrity_authors(user):
+    """Популярные авторы из подписок пользователя (fan-out on read)"""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__celebrity=True
+        ).values_list("author_id", flat=True)
+    )
+
+
+def follow_feed(user):
+    """Посты авторов, на которых подписан пользователь"""
+    celebrities = celebrity_authors(user)
+    if not celebrities:
+        return Post.objects.filter(
+            feed_entries__user=user
+        ).order_by("-feed_entries__pub_date")
+    inbox = FeedEntry.objects.filter(user=user).values("post_id")
+    return Post.objects.filter(
+        Q(id__in=inbox) | Q(author_id__in=celebrities)
+    )
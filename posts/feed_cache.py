@@ -0,0 +1,163 @@
+"""Кеш страниц ленты с немедленной инвалидацией и stale-while-revalidate.
+
+Кешируется общая для всех зрителей часть страницы — id постов страницы
+и данные паджинатора, то есть дорогие COUNT и OFFSET. Сами посты
+читаются при каждом показе одним запросом по первичному ключу, поэтому
+число комментариев и версия карточки (posts/cards.py) всегда свежие.
+Шапка, меню и ссылка «Редактировать» отрисовываются для каждого запроса
+отдельно.
+
+* Запись поста меняет «поколение» ленты — все прежние ключи сразу
+  перестают читаться.
+* Устаревшую по времени запись пересчитывает один процесс, захвативший
+  блокировку (cache.add), остальные в это время отдают старую версию.
+* При полном промахе остальные процессы недолго ждут результат
+  победителя, а не строят страницу одновременно с ним.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+
+from yatube.replicas import primary
+
+from .paginator import CursorPage, CursorPaginator, InvalidCursor, paginate
+
+FRESH_SECONDS = getattr(settings, "FEED_CACHE_FRESH_SECONDS", 20)
+STALE_SECONDS = getattr(settings, "FEED_CACHE_STALE_SECONDS", 600)
+LOCK_SECONDS = 10
+WAIT_SECONDS = 2
+POLL_SECONDS = 0.05
+
+GENERATION_KEY = "feed-cache:generation"
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # ключ вытеснен: новое значение не должно совпасть с прежними
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def invalidate():
+    """Сбросить все закешированные страницы лент"""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def _store(key, value):
+    cache.set(key, (time.time() + FRESH_SECONDS, value), STALE_SECONDS)
+    return value
+
+
+def get_or_build(name, build):
+    """Значение из кеша; build() вызывается не более чем одним процессом"""
+    build = _from_primary(build)
+    key = f"feed-cache:{generation()}:{name}"
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if time.time() < fresh_until:
+            return value
+        if cache.add(lock_key, 1, LOCK_SECONDS):
+            try:
+                return _store(key, build())
+            finally:
+                cache.delete(lock_key)
+        return value
+    if cache.add(lock_key, 1, LOCK_SECONDS):
+        try:
+            return _store(key, build())
+        finally:
+            cache.delete(lock_key)
+    deadline = time.time() + WAIT_SECONDS
+    while time.time() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    return _store(key, build())
+
+
+def _from_primary(build):
+    # страница в кеше видна всем: отстающая реплика не должна попасть в
+    # неё сразу после инвалидации записью
+    def wrapper():
+        with primary():
+            return build()
+    return wrapper
+
+
+def _snapshot(page):
+    ids = [post.id for post in page]
+    if getattr(page, "is_cursor", False):
+        return ("cursor", ids, page.has_next(), page.has_previous())
+    return ("offset", ids, page.number, page.paginator.count)
+
+
+def _load(object_list, ids):
+    """Посты страницы по id в порядке страницы; удалённые пропускаются"""
+    posts = {post.id: post for post in object_list.filter(pk__in=ids)}
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def _restore(snapshot, object_list, per_page):
+    kind, ids, *state = snapshot
+    posts = _load(object_list, ids)
+    if kind == "cursor":
+        has_next, has_previous = state
+        paginator = CursorPaginator(object_list, per_page)
+        return paginator, CursorPage(posts, paginator, has_next, has_previous)
+    number, count = state
+    paginator = Paginator(object_list, per_page)
+    paginator.count = count
+    return paginator, Page(posts, number, paginator)
+
+
+def _page_params(request, object_list, per_page, count):
+    """Часть ключа кеша: номер страницы или разобранный курсор. Битые и
+    лишние значения дают ключ первой (последней) страницы, а не новый
+    ключ на каждую строку из адреса"""
+    cursor = request.GET.get("cursor")
+    if cursor is not None or getattr(
+        settings, "POSTS_PAGINATION", "offset"
+    ) == "cursor":
+        try:
+            direction, values = CursorPaginator(
+                object_list, per_page
+            ).decode_cursor(cursor or "")
+        except InvalidCursor:
+            return "cursor:"
+        return f"cursor:{direction}:{':'.join(map(str, values))}"
+    try:
+        number = max(int(request.GET.get("page", 1)), 1)
+    except (TypeError, ValueError):
+        number = 1
+    if count is not None:
+        number = min(number, max(-(-count // per_page), 1))
+    return f"page:{number}"
+
+
+def cached_page(request, name, object_list, per_page, count=None):
+    """Как paginate(), но страница берётся из общего кеша ленты"""
+    params = _page_params(request, object_list, per_page, count)
+    key = f"{name}:{per_page}:{params}"
+    built = []
+
+    def build():
+        built.append(paginate(request, object_list, per_page, count))
+        return _snapshot(built[0][1])
+
+    snapshot = get_or_build(key, build)
+    if built:
+        page = built[0][1]
+        if params.startswith("page:") and f"page:{page.number}" != params:
+            # номер за последней страницей (число постов не было
+            # известно заранее): такой ключ не сохраняется
+            cache.delete(f"feed-cache:{generation()}:{key}")
+        # страница только что построена: посты уже загружены
+        return built[0]
+    return _restore(snapshot, object_list, per_page)
@@ -0,0 +1,143 @@
+"""Лента «Популярное»: посты по затухающему со временем рейтингу.
+
+Рейтинг поста в момент t — сумма весов событий, каждый из которых
+теряет половину веса за HOT_HALF_LIFE_HOURS часов (T):
+
+    score(t) = Σ wᵢ · 2^(−(t − tᵢ) / T)
+
+Публикация весит 1 + HOT_REACH_WEIGHT · ln(1 + подписчиков автора),
+каждый комментарий — HOT_COMMENT_WEIGHT. Сам score(t) меняется каждую
+секунду у всех постов сразу, но множитель 2^(−t/T) у всех общий и
+порядка не меняет. Поэтому в Post.hot_score хранится
+
+    ln Σ wᵢ · e^(tᵢ / τ),  где τ = T / ln 2,
+
+— число, которое меняется только при новом событии, а порядок по нему
+в любой момент совпадает с порядком по score(t). Лента — первые
+HOT_POSTS строк индекса (-hot_score, -id), без агрегатов по
+комментариям. Логарифм растёт линейно (на 1 за τ) и не переполняется,
+так что периодически пересчитывать затухание не нужно.
+
+Комментарий добавляет слагаемое тем же атомарным UPDATE, что и счётчик
+комментариев: ln(eᵃ + eᵇ) = max(a, b) + ln(1 + e^(−|a − b|)). Удалённые
+комментарии из рейтинга не вычитаются; ``manage.py rebuild_hot_scores``
+пересчитывает рейтинги с нуля (после удалений или смены весов).
+"""
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Comment, Post, UserStats
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 500
+
+
+def _tau():
+    hours = getattr(settings, "HOT_HALF_LIFE_HOURS", 12)
+    return hours * 3600 / math.log(2)
+
+
+def event_score(weight, when):
+    """Слагаемое события веса weight в момент when, в шкале hot_score"""
+    return math.log(weight) + (when - EPOCH).total_seconds() / _tau()
+
+
+def combine(a, b):
+    """ln(eᵃ + eᵇ) без переполнения"""
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def _add(value):
+    """Выражение UPDATE: прибавить к hot_score событие со значением value"""
+    return Greatest(F("hot_score"), value) + Ln(
+        Value(1.0) + Exp(-Abs(F("hot_score") - value))
+    )
+
+
+def publication_weight(followers):
+    return 1 + getattr(settings, "HOT_REACH_WEIGHT", 0.5) * math.log1p(
+        followers
+    )
+
+
+def score_new_posts(posts):
+    """Начальный рейтинг новых постов; подписчики всех авторов — одним
+    запросом"""
+    followers = dict(UserStats.objects.filter(
+        user_id__in={post.author_id for post in posts}
+    ).values_list("user_id", "followers"))
+    now = timezone.now()
+    for post in posts:
+        post.hot_score = event_score(
+            publication_weight(followers.get(post.author_id, 0)),
+            post.pub_date or now,
+        )
+
+
+def comment_changes(created):
+    """Поля UPDATE поста для нового комментария (см. counters)"""
+    weight = getattr(settings, "HOT_COMMENT_WEIGHT", 1.0)
+    return {"hot_score": _add(
+        Value(event_score(weight, created), output_field=FloatField())
+    )}
+
+
+def bump_comments_many(comments):
+    """comment_changes() для пачки комментариев: один UPDATE на
+    BATCH_SIZE постов"""
+    weight = getattr(settings, "HOT_COMMENT_WEIGHT", 1.0)
+    by_post = {}
+    for comment in comments:
+        score = event_score(weight, comment.created)
+        previous = by_post.get(comment.post_id)
+        by_post[comment.post_id] = (
+            score if previous is None else combine(previous, score)
+        )
+    post_ids = list(by_post)
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        chunk = post_ids[start:start + BATCH_SIZE]
+        value = Case(
+            *(When(pk=pk, then=Value(by_post[pk])) for pk in chunk),
+            output_field=FloatField(),
+        )
+        Post.objects.filter(pk__in=chunk).update(hot_score=_add(value))
+
+
+def hot_posts():
+    """Самые популярные посты сейчас: ограниченное чтение по индексу"""
+    limit = getattr(settings, "HOT_POSTS", 100)
+    return Post.objects.for_feed().order_by("-hot_score", "-id")[:limit]
+
+
+def rebuild():
+    """Пересчитать рейтинги всех постов, вернуть их количество"""
+    weight = getattr(settings, "HOT_COMMENT_WEIGHT", 1.0)
+    comments = defaultdict(list)
+    for post_id, created in Comment.objects.values_list(
+        "post_id", "created"
+    ).iterator():
+        comments[post_id].append(created)
+    followers = dict(UserStats.objects.values_list("user_id", "followers"))
+    batch = []
+    total = 0
+    for post in Post.objects.only("id", "author_id", "pub_date").iterator():
+        score = event_score(
+            publication_weight(followers.get(post.author_id, 0)),
+            post.pub_date,
+        )
+        for created in comments.get(post.id, ()):
+            score = combine(score, event_score(weight, created))
+        post.hot_score = score
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ["hot_score"])
+            total += len(batch)
+            batch = []
+    Post.objects.bulk_update(batch, ["hot_score"])
+    return total + len(batch)
@@ -0,0 +1,90 @@
+"""Варианты картинки поста для разных экранов и форматов.
+
+Из исходной картинки вырезается кадр с пропорциями карточки
+(960x339) и сохраняется в нескольких ширинах, в JPEG и WebP, а
+если Pillow собран с поддержкой AVIF — ещё и в AVIF. Карточка
+выводит их через <picture>/srcset, и мобильный браузер скачивает
+вариант по своему экрану, а не общий кадр 960 пикселей.
+"""
+import hashlib
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+WIDTHS = tuple(getattr(settings, "IMAGE_VARIANT_WIDTHS", (320, 640, 960)))
+ASPECT = 960 / 339
+QUALITY = {"JPEG": 82, "WEBP": 80, "AVIF": 60}
+MIME_TYPES = {"AVIF": "image/avif", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+EXTENSIONS = {"AVIF": "avif", "WEBP": "webp", "JPEG": "jpg"}
+
+
+def formats():
+    """Доступные форматы, от самого компактного к самому совместимому"""
+    Image.init()
+    return [name for name in ("AVIF", "WEBP", "JPEG") if name in Image.SAVE]
+
+
+def _frame(image):
+    """Кадр карточки по центру картинки, как crop="center" у sorl"""
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    width = max(WIDTHS)
+    return ImageOps.fit(
+        image, (width, round(width / ASPECT)), Image.LANCZOS, centering=(0.5, 0.5)
+    )
+
+
+def build(image_field, post_id):
+    """Сохранить все варианты картинки, вернуть их описание
+
+    {"JPEG": [[320, url], ...], "WEBP": [...], ...}
+    """
+    image_field.open("rb")
+    try:
+        frame = _frame(Image.open(image_field))
+    finally:
+        image_field.close()
+    token = hashlib.md5(image_field.name.encode()).hexdigest()[:8]
+    result = {}
+    for kind in formats():
+        result[kind] = []
+        for width in WIDTHS:
+            resized = frame.resize(
+                (width, round(width / ASPECT)), Image.LANCZOS
+            )
+            buffer = BytesIO()
+            resized.save(buffer, kind, quality=QUALITY[kind])
+            name = default_storage.save(
+                f"posts/variants/{post_id}/{token}-{width}.{EXTENSIONS[kind]}",
+                ContentFile(buffer.getvalue()),
+            )
+            result[kind].append([width, default_storage.url(name)])
+    return result
+
+
+def delete(variants):
+    """Удалить файлы вариантов, описанных в variants"""
+    for urls in variants.values():
+        for _, url in urls:
+            name = url[len(settings.MEDIA_URL):]
+            if default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def loads(data):
+    return json.loads(data) if data else {}
+
+
+def dumps(variants):
+    return json.dumps(variants, separators=(",", ":"))
+
+
+def srcsets(variants):
+    """Описание вариантов в виде [(mime, srcset), ...] для <picture>"""
+    return [
+        (MIME_TYPES[kind], ", ".join(f"{url} {width}w" for width, url in urls))
+        for kind, urls in variants.items()
+    ]
@@ -0,0 +1,274 @@
+"""Массовый импорт постов, комментариев и подписок.
+
+Записи читаются потоком из JSONL или CSV и пишутся пачками через
+bulk_create, каждая пачка — в своей транзакции. Сигналы при этом не
+срабатывают, поэтому производные данные (счётчики, поисковый индекс,
+ленты подписок) обновляются здесь же, одним-двумя запросами на пачку.
+
+Поля записей:
+
+* posts — author, text, group (slug, необязательно), pub_date (ISO 8601,
+  необязательно), id (необязательно: сохранить номер из источника,
+  чтобы на него ссылались комментарии);
+* comments — post (id поста), author, text, created (необязательно);
+* follows — user, author.
+
+Пользователи и группы ищутся по заранее загруженным словарям, тексты
+проверяются полями PostForm и CommentForm. Ошибочные записи
+пропускаются и возвращаются вызывающему коду.
+"""
+import csv
+import json
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, feed_cache, hot, search
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, User
+
+KINDS = ("posts", "comments", "follows")
+
+
+class RecordError(Exception):
+    pass
+
+
+def read_records(stream, fmt):
+    """Записи файла по одной: (номер строки, словарь)"""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, {key: value for key, value in row.items() if value}
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                yield number, RecordError(f"некорректный JSON: {error}")
+
+
+def _date(value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise RecordError(f"некорректная дата: {value}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def _clean(form_class, name, value):
+    """Значение, проверенное полем формы (без создания самой формы на
+    каждую запись — это заметная часть времени импорта)"""
+    try:
+        return form_class.base_fields[name].clean(value)
+    except ValidationError as error:
+        raise RecordError(f"{name}: {' '.join(error.messages)}")
+
+
+@contextmanager
+def _keep_dates(*fields):
+    """Не подменять даты из источника текущим временем (auto_now_add)"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _reset_sequence(model):
+    """Id выданы мимо последовательности базы (PostgreSQL): сдвинуть её,
+    иначе следующий обычный INSERT получит уже занятый id"""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def write_posts(posts):
+    """Записать пачку новых постов вместе с поиском, лентами и счётчиками;
+    вернуть (записанные, отклонённые с причиной)"""
+    explicit = {post.id for post in posts if post.id is not None}
+    taken = set(Post.objects.filter(
+        id__in=explicit
+    ).values_list("id", flat=True))
+    seen, rejected, accepted = set(), [], []
+    for post in posts:
+        if post.id in taken:
+            rejected.append((post, f"пост {post.id} уже есть"))
+        elif post.id in seen:
+            rejected.append((post, f"id {post.id} повторяется в пачке"))
+        else:
+            if post.id is not None:
+                seen.add(post.id)
+            accepted.append(post)
+    posts = accepted
+    # id нужны сразу: по ним строятся поиск и ленты. Автоматические id
+    # выдаются после всех явных, чтобы не совпасть с ними
+    top = Post.objects.aggregate(top=Max("id"))["top"] or 0
+    next_id = max([top, *seen]) + 1
+    for post in posts:
+        if post.id is None:
+            post.id = next_id
+            next_id += 1
+    hot.score_new_posts(posts)
+    Post.objects.bulk_create(posts)
+    _reset_sequence(Post)
+    search.index_posts(posts, replace=False)
+    feed.fan_out_posts(posts)
+    counters.bump_many("posts", Counter(p.author_id for p in posts))
+    counters.bump_groups(posts)
+    return posts, rejected
+
+
+def write_comments(comments):
+    """Записать пачку комментариев к существующим постам и обновить
+    счётчики; вернуть (записанные, отклонённые с причиной)"""
+    existing = set(Post.objects.filter(
+        id__in={comment.post_id for comment in comments}
+    ).values_list("id", flat=True))
+    rejected = [
+        (comment, f"нет поста {comment.post_id}")
+        for comment in comments if comment.post_id not in existing
+    ]
+    comments = [c for c in comments if c.post_id in existing]
+    Comment.objects.bulk_create(comments)
+    counters.bump_comments_many(Counter(c.post_id for c in comments))
+    hot.bump_comments_many(comments)
+    return comments, rejected
+
+
+class Importer:
+    def __init__(self, kind):
+        if kind not in KINDS:
+            raise ValueError(kind)
+        self.kind = kind
+        self.users = dict(User.objects.values_list("username", "id"))
+        self.groups = dict(Group.objects.values_list("slug", "id"))
+        self.now = timezone.now()
+
+    def _user(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise RecordError(f"нет пользователя {username!r}")
+
+    # разбор записей
+
+    def build_post(self, record):
+        post = Post(
+            author_id=self._user(record.get("author")),
+            text=_clean(PostForm, "text", record.get("text", "")),
+        )
+        if record.get("id"):
+            try:
+                post.id = int(record["id"])
+            except ValueError:
+                raise RecordError(f"некорректный id: {record['id']!r}")
+        post.pub_date = _date(record.get("pub_date")) or self.now
+        slug = record.get("group")
+        if slug:
+            try:
+                post.group_id = self.groups[slug]
+            except KeyError:
+                raise RecordError(f"нет группы {slug!r}")
+        return post
+
+    def build_comment(self, record):
+        try:
+            post_id = int(record.get("post"))
+        except (TypeError, ValueError):
+            raise RecordError(f"некорректный пост: {record.get('post')!r}")
+        comment = Comment(
+            post_id=post_id,
+            author_id=self._user(record.get("author")),
+            text=_clean(CommentForm, "text", record.get("text", "")),
+        )
+        comment.created = _date(record.get("created")) or self.now
+        return comment
+
+    def build_follow(self, record):
+        user_id = self._user(record.get("user"))
+        author_id = self._user(record.get("author"))
+        if user_id == author_id:
+            raise RecordError("подписка на самого себя")
+        return Follow(user_id=user_id, author_id=author_id)
+
+    # запись пачек
+
+    def save_posts(self, posts):
+        with _keep_dates(Post._meta.get_field("pub_date")):
+            return write_posts(posts)
+
+    def save_comments(self, comments):
+        with _keep_dates(Comment._meta.get_field("created")):
+            return write_comments(comments)
+
+    def save_follows(self, follows):
+        existing = set(Follow.objects.filter(
+            user_id__in={follow.user_id for follow in follows},
+            author_id__in={follow.author_id for follow in follows},
+        ).values_list("user_id", "author_id"))
+        new = {}
+        for follow in follows:
+            pair = (follow.user_id, follow.author_id)
+            if pair not in existing:
+                new.setdefault(pair, follow)
+        follows = list(new.values())
+        Follow.objects.bulk_create(follows)
+        authors = Counter(f.author_id for f in follows)
+        counters.bump_many("followers", authors)
+        counters.bump_many("following", Counter(f.user_id for f in follows))
+        # ставший популярным автор не раскладывает посты и новым подписчикам
+        feed.update_celebrities(list(authors))
+        feed.backfill_many((f.user_id, f.author_id) for f in follows)
+        return follows, []
+
+    def run(self, records, batch_size=1000, skip=0, on_batch=None):
+        """Импортировать записи, пропустив первые skip (уже загруженные)
+
+        on_batch(обработано записей, сохранено, ошибки) вызывается после
+        фиксации каждой пачки. Возвращает (сохранено, ошибки)."""
+        build = getattr(self, f"build_{self.kind[:-1]}")
+        save = getattr(self, f"save_{self.kind}")
+        records = islice(records, skip, None)
+        processed, saved, all_errors = skip, 0, []
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            objects, errors, lines = [], [], {}
+            for number, record in batch:
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    obj = build(record)
+                except RecordError as error:
+                    errors.append((number, str(error)))
+                    continue
+                objects.append(obj)
+                lines[id(obj)] = number
+            with transaction.atomic():
+                written, rejected = save(objects)
+            errors += [(lines[id(obj)], message) for obj, message in rejected]
+            errors.sort()
+            processed += len(batch)
+            saved += len(written)
+            all_errors += errors
+            if on_batch is not None:
+                on_batch(processed, saved, errors)
+        if saved:
+            feed_cache.invalidate()
+        return saved, all_errors
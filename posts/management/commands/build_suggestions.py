@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рекомендации «кого читать» по графу подписок "
+        "(запускать периодически, например раз в сутки)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Число процессов для расчёта",
+        )
+        parser.add_argument(
+            "--limit", type=int,
+            help="Рекомендаций на пользователя (SUGGESTIONS_PER_USER)",
+        )
+
+    def handle(self, *args, **options):
+        total = suggestions.build(options["limit"], options["workers"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Сохранено рекомендаций: {total}")
+        )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает посты, комментарии или подписки в JSONL (можно сжатый: "
+        ".gz, .bz2, .xz) или в Parquet"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=exporter.KINDS)
+        parser.add_argument("path", help="Файл выгрузки; - — stdout (JSONL)")
+        parser.add_argument(
+            "--format",
+            choices=("jsonl", "parquet"),
+            help="Формат (по умолчанию по расширению файла)"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=exporter.CHUNK_SIZE,
+            help="Строк за одно чтение из базы"
+        )
+
+    def handle(self, *args, **options):
+        kind, path = options["kind"], options["path"]
+        fmt = options["format"] or (
+            "parquet" if path.endswith(".parquet") else "jsonl"
+        )
+
+        def progress(total):
+            self.stderr.write(f"Выгружено {total}")
+
+        if fmt == "parquet":
+            if path == "-":
+                raise CommandError("Parquet пишется только в файл")
+            try:
+                import pyarrow  # noqa
+            except ImportError:
+                raise CommandError("Для Parquet нужен пакет pyarrow")
+            total = exporter.write_parquet(
+                kind, path, options["chunk_size"], progress
+            )
+        elif path == "-":
+            total = exporter.write_jsonl(
+                kind, self.stdout, options["chunk_size"], progress
+            )
+        else:
+            with exporter.open_output(path) as stream:
+                total = exporter.write_jsonl(
+                    kind, stream, options["chunk_size"], progress
+                )
+        self.stderr.write(self.style.SUCCESS(f"Выгружено записей: {total}"))
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+BATCH_SIZE = 20
+
+
+def generate_batch(post_ids):
+    """Обработать пачку постов в процессе пула, вернуть (готово, ошибки)"""
+    done, errors = 0, []
+    try:
+        for post_id in post_ids:
+            try:
+                thumbnails.generate(post_id)
+                done += 1
+            except Exception as error:
+                errors.append(f"пост {post_id}: {error}")
+    finally:
+        db.connections.close_all()
+    return done, errors
+
+
+def batches(post_ids, size):
+    post_ids = iter(post_ids)
+    while True:
+        batch = list(islice(post_ids, size))
+        if not batch:
+            return
+        yield batch
+
+
+class InlineResult:
+    """Обработка в текущем процессе при --workers 1"""
+
+    def __init__(self, post_ids):
+        self.post_ids = post_ids
+
+    def result(self):
+        done, errors = 0, []
+        for post_id in self.post_ids:
+            try:
+                thumbnails.generate(post_id)
+                done += 1
+            except Exception as error:
+                errors.append(f"пост {post_id}: {error}")
+        return done, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Готовит миниатюры и варианты картинок для постов, у которых их "
+        "ещё нет (с --all — для всех постов с картинкой)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Число процессов; 1 — обрабатывать в текущем процессе"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Сколько постов отдавать процессу за раз"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересобрать варианты и для постов, где они уже есть"
+        )
+
+    def handle(self, *args, **options):
+        post_ids = list(
+            thumbnails.pending(refresh=options["all"]).values_list(
+                "id", flat=True
+            )
+        )
+        parts = batches(post_ids, options["batch_size"])
+        pool = None
+        if options["workers"] > 1:
+            # дочерние процессы не должны унаследовать открытые соединения
+            db.connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options["workers"])
+            results = [pool.submit(generate_batch, batch) for batch in parts]
+        else:
+            results = [InlineResult(batch) for batch in parts]
+        done = failed = 0
+        try:
+            for result in results:
+                batch_done, errors = result.result()
+                done += batch_done
+                failed += len(errors)
+                for error in errors:
+                    self.stderr.write(f"Ошибка: {error}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово миниатюр: {done}, ошибок: {failed}")
+        )
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import KINDS, Importer, read_records
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, processed):
+    # запись через временный файл: оборванная запись не портит отметку
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as checkpoint:
+        checkpoint.write(str(processed))
+    os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует посты, комментарии или подписки из JSONL или CSV "
+        "пачками; формат записей описан в posts/importer.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument("path", help="Файл с записями; - — stdin")
+        parser.add_argument(
+            "--format",
+            choices=("jsonl", "csv"),
+            help="Формат файла (по умолчанию по расширению)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Записей в одной пачке и транзакции"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help=(
+                "Файл с числом уже импортированных записей: обновляется "
+                "после каждой пачки, при повторном запуске импорт "
+                "продолжается с этого места"
+            )
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path != "-" and not os.path.exists(path):
+            raise CommandError(f"Нет файла {path}")
+        fmt = options["format"] or (
+            "csv" if path.lower().endswith(".csv") else "jsonl"
+        )
+        checkpoint = options["checkpoint"]
+        skip = read_checkpoint(checkpoint) if checkpoint else 0
+        if skip:
+            self.stdout.write(f"Продолжение с записи {skip + 1}")
+        started = time.perf_counter()
+
+        def on_batch(processed, saved, errors):
+            if checkpoint:
+                write_checkpoint(checkpoint, processed)
+            for number, message in errors:
+                self.stderr.write(f"Строка {number}: {message}")
+            rate = (processed - skip) / (time.perf_counter() - started)
+            self.stdout.write(
+                f"Обработано {processed}, сохранено {saved} "
+                f"({rate:.0f} записей/с)"
+            )
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            saved, errors = Importer(options["kind"]).run(
+                read_records(stream, fmt),
+                batch_size=options["batch_size"],
+                skip=skip,
+                on_batch=on_batch,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано: {saved}, пропущено с ошибками: {len(errors)}"
+        ))
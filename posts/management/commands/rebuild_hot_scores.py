@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import hot
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рейтинги ленты «Популярное» по постам и "
+        "комментариям (после удалений или смены весов HOT_*)"
+    )
+
+    def handle(self, *args, **options):
+        total = hot.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано рейтингов: {total}")
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Пересобирает полнотекстовый индекс постов"
+
+    def handle(self, *args, **options):
+        if search.backend() != "fts5":
+            self.stdout.write(
+                f"Для поиска ({search.backend()}) отдельный индекс "
+                "не нужно пересобирать"
+            )
+            return
+        total = search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Проиндексировано постов: {total}")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = "Сверяет денормализованные счётчики с исходными таблицами"
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f"Исправлено счётчиков: {fixed}")
+        )
@@ -0,0 +1,42 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в файлы реплик (локальная замена "
+        "репликации)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*",
+            help="Файлы реплик; по умолчанию — все из settings.REPLICAS",
+        )
+
+    def handle(self, *args, **options):
+        primary = connections["default"]
+        if primary.vendor != "sqlite":
+            raise CommandError("Команда только для SQLite")
+        paths = options["paths"] or [
+            connections[alias].settings_dict["NAME"]
+            for alias in settings.REPLICAS
+        ]
+        if not paths:
+            raise CommandError("Реплики не настроены (YATUBE_REPLICAS)")
+        if primary.in_atomic_block:
+            # копирование ждало бы конца собственной транзакции
+            raise CommandError("Команду нельзя вызывать в транзакции")
+        primary.ensure_connection()
+        for path in paths:
+            # online backup: читатели реплики видят либо старую, либо
+            # новую копию целиком
+            target = sqlite3.connect(path, timeout=30)
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Обновлена реплика {path}")
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.9 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Только схема: ленты существующих подписок заполняет
+# ``python manage.py rebuild_feeds`` — по тем же правилам, что и в работе
+# (без раскладки постов популярных авторов, не больше FEED_BACKFILL_POSTS
+# постов автора)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_auto_20200909_1147'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date'], name='posts_feede_user_id_ec0439_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('user', 'post')},
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.9 on 2026-10-18 17:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    """Считает счётчики для уже существующих данных"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Post = apps.get_model("posts", "Post")
+    Follow = apps.get_model("posts", "Follow")
+    UserStats = apps.get_model("posts", "UserStats")
+    for user in User.objects.all().iterator():
+        UserStats.objects.create(
+            user=user,
+            followers=Follow.objects.filter(author=user).count(),
+            following=Follow.objects.filter(user=user).count(),
+            posts=Post.objects.filter(author=user).count(),
+        )
+    for post in Post.objects.annotate(
+        count=models.Count("comments")
+    ).filter(count__gt=0).iterator():
+        Post.objects.filter(pk=post.pk).update(comment_count=post.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0013_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('following', models.PositiveIntegerField(default=0)),
+                ('posts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
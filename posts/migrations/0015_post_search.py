@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Таблица FTS5 создаётся пустой: миграция не зависит от текущего кода
+# posts.search (стеммер может меняться). Посты, написанные до неё,
+# индексирует ``python manage.py rebuild_search_index`` — пачками, не
+# собирая весь индекс в память
+FTS_TABLE = "posts_post_fts"
+
+
+def create_search_index(apps, schema_editor):
+    """Создаёт полнотекстовый индекс для текущей базы"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(stems)"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS posts_post_text_tsv "
+            "ON posts_post USING GIN (to_tsvector('russian', text))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS posts_post_text_tsv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
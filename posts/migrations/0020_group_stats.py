@@ -0,0 +1,44 @@
+# Generated by Django 2.2.9 on 2026-10-18 17:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    """Считает счётчики для уже существующих групп"""
+    Group = apps.get_model("posts", "Group")
+    GroupStats = apps.get_model("posts", "GroupStats")
+    for group in Group.objects.annotate(
+        post_count=models.Count("posts"),
+        author_count=models.Count("posts__author", distinct=True),
+        last_post_at=models.Max("posts__pub_date"),
+    ).iterator():
+        GroupStats.objects.create(
+            group=group,
+            posts=group.post_count,
+            authors=group.author_count,
+            last_post_at=group.last_post_at,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('authors', models.PositiveIntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-posts', 'group'], name='posts_group_posts_297015_idx'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
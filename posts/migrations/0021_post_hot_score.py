@@ -0,0 +1,60 @@
+# Generated by Django 2.2.9 on 2026-10-18 18:07
+
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_hot_scores(apps, schema_editor):
+    """Начальные рейтинги существующих постов, как в posts.hot.rebuild"""
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    UserStats = apps.get_model("posts", "UserStats")
+    epoch = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    tau = getattr(settings, "HOT_HALF_LIFE_HOURS", 12) * 3600 / math.log(2)
+    reach = getattr(settings, "HOT_REACH_WEIGHT", 0.5)
+    comment_weight = getattr(settings, "HOT_COMMENT_WEIGHT", 1.0)
+
+    def score(weight, when):
+        return math.log(weight) + (when - epoch).total_seconds() / tau
+
+    followers = dict(UserStats.objects.values_list("user_id", "followers"))
+    comments = {}
+    for post_id, created in Comment.objects.values_list("post_id", "created"):
+        comments.setdefault(post_id, []).append(created)
+    posts = list(Post.objects.only("id", "author_id", "pub_date"))
+    for post in posts:
+        total = score(
+            1 + reach * math.log1p(followers.get(post.author_id, 0)),
+            post.pub_date,
+        )
+        for created in comments.get(post.id, ()):
+            other = score(comment_weight, created)
+            total = max(total, other) + math.log1p(
+                math.exp(-abs(total - other))
+            )
+        post.hot_score = total
+    Post.objects.bulk_update(posts, ["hot_score"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_group_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='posts_post_hot_sco_c26496_idx'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# ровно то выражение, которое Django строит из
+# SearchVector("text", config="russian"): иначе индекс не используется
+INDEX_EXPRESSION = "to_tsvector('russian'::regconfig, COALESCE(text, ''))"
+OLD_EXPRESSION = "to_tsvector('russian', text)"
+
+
+def _recreate_index(expression):
+    def recreate(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        schema_editor.execute("DROP INDEX IF EXISTS posts_post_text_tsv")
+        schema_editor.execute(
+            "CREATE INDEX posts_post_text_tsv "
+            f"ON posts_post USING GIN ({expression})"
+        )
+    return recreate
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_suggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _recreate_index(INDEX_EXPRESSION),
+            _recreate_index(OLD_EXPRESSION),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.9 on 2026-10-18 18:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    """Флаг для авторов, которые уже сейчас выше порога раскладки"""
+    UserStats = apps.get_model("posts", "UserStats")
+    threshold = getattr(settings, "FEED_FANOUT_MAX_FOLLOWERS", 1000)
+    UserStats.objects.filter(followers__gt=threshold).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_search_index_expression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
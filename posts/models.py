@@ -13,6 +13,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа загружаются одним JOIN"""
+        return self.select_related("author", "group")
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name="Текст поста",
@@ -38,12 +44,39 @@ class Post(models.Model):
         blank=True, 
         null=True
     ) 
+    # поддерживается сигналами, см. posts/counters.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # растёт при любом изменении карточки поста, см. posts/cards.py
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # адрес готовой миниатюры, пусто — пока она готовится (posts/thumbnails.py)
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    # варианты картинки разной ширины и формата в JSON, см. posts/images.py
+    image_variants = models.TextField(blank=True, editable=False)
+    # затухающий рейтинг для ленты «Популярное», см. posts/hot.py
+    hot_score = models.FloatField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text
+
+    @property
+    def srcsets(self):
+        """[(mime, srcset), ...] для <source> в карточке поста"""
+        from .images import loads, srcsets
+        return srcsets(loads(self.image_variants))
         
     class Meta:
-        ordering = ("-pub_date",)
+        # id — чтобы порядок постов с одинаковой датой был однозначным;
+        # индексы повторяют этот порядок, и страницы лент читаются по
+        # индексу без сортировки
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"]),
+            models.Index(fields=["group", "-pub_date", "-id"]),
+            models.Index(fields=["author", "-pub_date", "-id"]),
+            models.Index(fields=["-hot_score", "-id"]),
+        ]
 
 
 class Comment(models.Model):
@@ -62,6 +95,7 @@ class Comment(models.Model):
 
     class Meta:  
         ordering = ("created",)
+        indexes = [models.Index(fields=["post", "created"])]
 
 
 class Follow(models.Model):
@@ -78,3 +112,80 @@ class Follow(models.Model):
 
     class Meta:  
         unique_together = ("user", "author")
+        # подписчики автора читаются из индекса, без обращения к таблице
+        indexes = [models.Index(fields=["author", "user"])]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок (fan-out on write)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="feed_entries"
+    )
+    # копия Post.pub_date, чтобы лента сортировалась по индексу
+    # без обращения к таблице постов
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [models.Index(fields=["user", "-pub_date"])]
+
+
+class UserStats(models.Model):
+    """Счётчики профиля, чтобы шапка профиля читалась одной строкой"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats"
+    )
+    followers = models.PositiveIntegerField(default=0)
+    following = models.PositiveIntegerField(default=0)
+    posts = models.PositiveIntegerField(default=0)
+    # посты не раскладываются по лентам, а подмешиваются при чтении;
+    # флаг меняется с гистерезисом, см. posts/feed.py
+    celebrity = models.BooleanField(default=False)
+
+
+
+class GroupStats(models.Model):
+    """Счётчики группы для её шапки и каталога групп, см. posts/counters.py"""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats"
+    )
+    posts = models.PositiveIntegerField(default=0)
+    # сколько разных авторов писали в группу
+    authors = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # каталог показывает сначала группы с наибольшим числом постов
+        indexes = [models.Index(fields=["-posts", "group"])]
+
+
+class Suggestion(models.Model):
+    """Рекомендация «кого читать», строится пакетно: posts/suggestions.py"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="suggestions"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    score = models.FloatField()
+
+    class Meta:
+        # рекомендации пользователя читаются по индексу уже в нужном порядке
+        indexes = [models.Index(fields=["user", "-score"])]
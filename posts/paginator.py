@@ -0,0 +1,153 @@
+"""Постраничный вывод лент.
+
+По умолчанию используется обычный Paginator (номер страницы + COUNT).
+Курсорный режим (keyset) выбирается параметром ``?cursor=`` или
+настройкой POSTS_PAGINATION = "cursor": страница выбирается условием
+по (pub_date, id) от последней показанной записи, без OFFSET и без
+подсчёта общего количества, поэтому любая страница стоит как первая.
+"""
+import base64
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator:
+    """Keyset-пагинация по полям ordering (по умолчанию -pub_date, -id)"""
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id")):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            self._field(name).value_to_string(obj) for name in self.fields
+        ]
+        data = json.dumps([direction] + values, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, *values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError(direction)
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            return direction, [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except Exception as error:
+            raise InvalidCursor(cursor) from error
+
+    def _field(self, name):
+        if name == "pk":
+            return self.object_list.model._meta.pk
+        return self.object_list.model._meta.get_field(name)
+
+    def _seek(self, values, forward):
+        """Условие «строго после ключа» для лексикографического порядка"""
+        condition = Q()
+        equal = {}
+        for name, field, value in zip(self.ordering, self.fields, values):
+            descending = name.startswith("-")
+            lookup = "lt" if descending == forward else "gt"
+            condition |= Q(**equal, **{f"{field}__{lookup}": value})
+            equal[field] = value
+        return condition
+
+    def page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        forward = direction == NEXT
+        ordering = self.ordering
+        if not forward:
+            ordering = [
+                name[1:] if name.startswith("-") else f"-{name}"
+                for name in ordering
+            ]
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return CursorPage(rows, self, has_more, values is not None)
+        rows.reverse()
+        return CursorPage(rows, self, True, has_more)
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: битый курсор даёт первую страницу"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+def paginate(request, object_list, per_page, count=None):
+    """Паджинатор и страница для ленты в выбранном режиме; count — уже
+    известное число записей, чтобы не считать его запросом COUNT"""
+    cursor = request.GET.get("cursor")
+    mode = getattr(settings, "POSTS_PAGINATION", "offset")
+    if cursor is not None or mode == "cursor":
+        paginator = CursorPaginator(object_list, per_page)
+        return paginator, paginator.get_page(cursor)
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    return paginator, paginator.get_page(request.GET.get("page"))
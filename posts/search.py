@@ -0,0 +1,277 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite посты индексируются в виртуальной таблице FTS5
+``posts_post_fts``: в неё пишутся основы слов (стеммер Snowball для
+русского языка ниже), ранжирование — bm25. На PostgreSQL — совпадение
+``@@`` по GIN-индексу на выражении, которое строит
+``SearchVector("text", config="russian")`` (миграция 0023), и ts_rank.
+На прочих базах остаётся прежний поиск через icontains.
+
+Индекс обновляется сигналами при сохранении и удалении поста, полностью
+пересобирается командой ``manage.py rebuild_search_index``.
+"""
+import re
+from functools import lru_cache
+from itertools import islice
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = "posts_post_fts"
+BATCH_SIZE = 1000
+SNIPPET_WORDS = 30
+
+WORD_RE = re.compile(r"\w+")
+VOWELS = "аеиоуыэюя"
+
+PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")
+PERFECTIVE_GERUND_2 = ("ывшись", "ившись", "ывши", "ивши", "ыв", "ив")
+ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей",
+    "ий", "ый", "ой", "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая",
+    "яя", "ою", "ею",
+)
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+REFLEXIVE = ("ся", "сь")
+VERB_1 = (
+    "ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет",
+    "ют", "ны", "ть", "й", "л", "н",
+)
+VERB_2 = (
+    "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло",
+    "ено", "ует", "уют", "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл",
+    "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю",
+)
+NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье",
+    "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию",
+    "ью", "ия", "ья", "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _strip(word, endings, preceded_by_a=False):
+    """Отрезать самое длинное подходящее окончание или вернуть None
+    (окончания в группах перечислены от длинных к коротким)"""
+    for ending in endings:
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if preceded_by_a and not stem.endswith(("а", "я")):
+            continue
+        return stem
+    return None
+
+
+def _region(word, start=0):
+    """Начало области после первой пары «гласная + согласная»"""
+    for index in range(start + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            return index + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова (алгоритм Snowball Russian)"""
+    word = word.lower().replace("ё", "е")
+    rv_start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        len(word),
+    )
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = max(_region(word, _region(word)) - rv_start, 0)
+
+    # шаг 1
+    stripped = _strip(rv, PERFECTIVE_GERUND_1, preceded_by_a=True)
+    if stripped is None:
+        stripped = _strip(rv, PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        rv = stripped
+    else:
+        reflexive = _strip(rv, REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        adjective = _strip(rv, ADJECTIVE)
+        if adjective is not None:
+            participle = _strip(adjective, PARTICIPLE_1, preceded_by_a=True)
+            if participle is None:
+                participle = _strip(adjective, PARTICIPLE_2)
+            rv = adjective if participle is None else participle
+        else:
+            verb = _strip(rv, VERB_1, preceded_by_a=True)
+            if verb is None:
+                verb = _strip(rv, VERB_2)
+            if verb is None:
+                verb = _strip(rv, NOUN)
+            if verb is not None:
+                rv = verb
+    # шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    # шаг 3
+    derivational = _strip(rv, DERIVATIONAL)
+    if derivational is not None and len(derivational) >= r2_start:
+        rv = derivational
+    # шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith("нн") else superlative
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+def stems(text):
+    return [stem(token) for token in tokenize(text)]
+
+
+def backend():
+    """Какой механизм поиска доступен на текущей базе"""
+    if connection.vendor == "sqlite":
+        return "fts5"
+    if connection.vendor == "postgresql":
+        return "postgres"
+    return "icontains"
+
+
+def _match_expression(keyword):
+    """FTS5-запрос: все основы слов запроса (AND), в кавычках —
+    чтобы пользовательский ввод не разбирался как синтаксис FTS5"""
+    return " ".join(f'"{term}"' for term in dict.fromkeys(stems(keyword)))
+
+
+def index_posts(posts, replace=True):
+    """Добавить или обновить посты в индексе FTS5"""
+    if backend() != "fts5":
+        return
+    rows = [(post.id, " ".join(stems(post.text))) for post in posts]
+    with connection.cursor() as cursor:
+        if replace:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(post_id,) for post_id, _ in rows],
+            )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)", rows
+        )
+
+
+def remove_post(post_id):
+    if backend() != "fts5":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild():
+    """Пересобрать индекс FTS5 по всем постам, вернуть их количество"""
+    if backend() != "fts5":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    posts = Post.objects.only("id", "text").order_by().iterator()
+    total = 0
+    while True:
+        batch = list(islice(posts, BATCH_SIZE))
+        if not batch:
+            return total
+        index_posts(batch, replace=False)
+        total += len(batch)
+
+
+class Fts5Results:
+    """Ленивая выборка результатов FTS5 для Paginator: COUNT и страница
+    считаются по виртуальной таблице, посты загружаются только для
+    показываемой страницы"""
+
+    def __init__(self, keyword):
+        self.match = _match_expression(keyword)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s",
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if not self.match or index.stop is not None and index.stop <= start:
+            return []
+        limit = -1 if index.stop is None else index.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s",
+                [self.match, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search(keyword):
+    """Найденные посты в порядке релевантности"""
+    kind = backend()
+    if kind == "fts5":
+        return Fts5Results(keyword)
+    if kind == "postgres":
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector
+        )
+        vector = SearchVector("text", config="russian")
+        query = SearchQuery(keyword, config="russian")
+        # фильтр по @@ идёт по индексу, ранжируются только найденные посты
+        return Post.objects.for_feed().annotate(
+            search=vector, rank=SearchRank(vector, query)
+        ).filter(search=query).order_by("-rank", "-pub_date")
+    return Post.objects.for_feed().filter(text__icontains=keyword)
+
+
+def snippet(text, keyword, words=SNIPPET_WORDS):
+    """Фрагмент текста вокруг первого совпадения, совпадения в <mark>"""
+    wanted = set(stems(keyword))
+    tokens = list(WORD_RE.finditer(text))
+    first = next(
+        (number for number, token in enumerate(tokens)
+         if stem(token.group()) in wanted),
+        0,
+    )
+    start = max(first - words // 3, 0)
+    window = tokens[start:start + words]
+    if not window:
+        return escape(text)
+    begin, end = window[0].start(), window[-1].end()
+    parts = ["…" if begin else ""]
+    position = begin
+    for token in window:
+        parts.append(escape(text[position:token.start()]))
+        word = escape(token.group())
+        if stem(token.group()) in wanted:
+            word = f"<mark>{word}</mark>"
+        parts.append(word)
+        position = token.end()
+    parts.append("…" if end < len(text) else "")
+    return mark_safe("".join(parts))
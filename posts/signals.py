@@ -0,0 +1,115 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import counters, feed, feed_cache, hot, search, thumbnails
+from .models import (
+    Comment, Follow, Group, GroupStats, Post, User, UserStats
+)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    """У нового пользователя сразу есть строка счётчиков"""
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    """Новая картинка — старая миниатюра больше не подходит; прежняя
+    группа нужна, чтобы после сохранения поправить счётчики групп"""
+    if instance._state.adding:
+        hot.score_new_posts([instance])
+        return
+    old_image, instance.old_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list("image", "group_id").first() or (None, None)
+    if old_image != instance.image.name:
+        instance.thumbnail = ""
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков и в поисковый индекс"""
+    search.index_posts([instance])
+    feed_cache.invalidate()
+    if instance.image and not instance.thumbnail:
+        thumbnails.schedule(instance.id)
+    if created:
+        counters.bump(instance.author_id, posts=1)
+        counters.bump_groups([instance])
+        feed.fan_out_post(instance)
+    else:
+        # правка поста: закешированная карточка устарела
+        Post.objects.filter(pk=instance.pk).update(version=F("version") + 1)
+        instance.version += 1
+        old_group_id = getattr(instance, "old_group_id", instance.group_id)
+        if old_group_id != instance.group_id:
+            moved = Post(
+                author_id=instance.author_id,
+                group_id=old_group_id,
+                pub_date=instance.pub_date,
+            )
+            counters.bump_groups([moved], -1)
+            counters.bump_groups([instance])
+            instance.old_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts=-1)
+    counters.bump_groups([instance], -1)
+    search.remove_post(instance.id)
+    feed_cache.invalidate()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    """Название и адрес группы выводятся в карточках её постов"""
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+    else:
+        instance.posts.update(version=F("version") + 1)
+        feed_cache.invalidate()
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    instance.posts.update(version=F("version") + 1)
+    feed_cache.invalidate()
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        # рейтинг «Популярного» — тем же UPDATE, что и счётчик
+        counters.bump_comments(
+            instance.post_id, 1, **hot.comment_changes(instance.created)
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """После подписки в ленте появляются старые посты автора"""
+    if created:
+        counters.bump(instance.author_id, followers=1)
+        counters.bump(instance.user_id, following=1)
+        feed.update_celebrities([instance.author_id])
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """После отписки посты автора пропадают из ленты"""
+    counters.bump(instance.author_id, followers=-1)
+    counters.bump(instance.user_id, following=-1)
+    feed.prune(instance.user_id, instance.author_id)
+    feed.update_celebrities([instance.author_id])
@@ -0,0 +1,232 @@
+"""Рекомендации «кого читать» по графу подписок.
+
+Считаются пакетно (``python manage.py build_suggestions``, например раз в
+сутки по cron) и сохраняются в Suggestion: SUGGESTIONS_PER_USER лучших
+авторов на пользователя. Страница потом читает их одним запросом по
+индексу (user, -score), см. templatetags/suggestions.py.
+
+Граф целиком загружается в память сырым SQL, без объектов ORM, в два
+CSR-массива модуля array: подписки и подписчики каждого пользователя
+лежат подряд в одном массиве id, границы — в массиве смещений. Миллионы
+подписок занимают десятки мегабайт.
+
+Оценка кандидата c для пользователя u складывается из двух частей:
+
+* друзья друзей: по FOF_WEIGHT за каждого автора, которого читает u и
+  который сам подписан на c;
+* со-подписки: читатели v, подписанные на тех же авторов, что и u, —
+  похожие читатели. Похожесть — сумма 1 / ln(2 + подписчиков автора) по
+  общим авторам (общий знаменитый автор значит меньше, чем общий редкий).
+  c получает похожесть каждого из SIMILAR_READERS самых похожих
+  читателей, который на него подписан.
+
+Сам u и те, кого он уже читает, не предлагаются; недостающие места
+(например, у новых пользователей без подписок) занимают самые популярные
+авторы. Чтобы время расчёта не зависело от знаменитостей, у каждого
+автора просматривается не больше FANOUT_CAP подписок и READERS_CAP
+подписчиков (равномерной выборкой). Пользователи делятся на части,
+которые можно считать в нескольких процессах (--workers).
+"""
+import heapq
+import math
+import multiprocessing
+from array import array
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Follow, Suggestion, User
+
+FOF_WEIGHT = 1.0
+SIMILAR_READERS = 30
+FANOUT_CAP = 200
+# у знаменитого автора похожих читателей всё равно много, а вес каждого мал
+READERS_CAP = 50
+CHUNK_SIZE = 1000
+
+
+class Graph:
+    """Подписки и подписчики в CSR-массивах, индекс — id пользователя"""
+
+    def __init__(self, users, authors, size):
+        self.size = size
+        self.following = _csr(users, authors, size)
+        self.followers = _csr(authors, users, size)
+
+    def follows(self, user):
+        offsets, ids = self.following
+        return ids[offsets[user]:offsets[user + 1]]
+
+    def follower_count(self, author):
+        offsets = self.followers[0]
+        return offsets[author + 1] - offsets[author]
+
+    def popular(self, limit):
+        """Авторы с наибольшим числом подписчиков"""
+        return [
+            author for author in heapq.nlargest(
+                limit, range(self.size), key=self.follower_count
+            ) if self.follower_count(author)
+        ]
+
+
+def _csr(keys, values, size):
+    offsets = array("q", bytes(8 * (size + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for node in range(size):
+        offsets[node + 1] += offsets[node]
+    ids = array("i", bytes(4 * len(keys)))
+    position = array("q", offsets)
+    for key, value in zip(keys, values):
+        ids[position[key]] = value
+        position[key] += 1
+    return offsets, ids
+
+
+def _sample(csr, node, cap=FANOUT_CAP):
+    """Не больше cap соседей узла, равномерно по всему списку"""
+    offsets, ids = csr
+    start, end = offsets[node], offsets[node + 1]
+    step = -(-(end - start) // cap) or 1
+    return ids[start:end:step]
+
+
+def load_graph(size=None):
+    """Граф подписок из таблицы Follow, без создания объектов модели.
+
+    size — верхняя граница id плюс один; подписки пользователей,
+    зарегистрированных позже (с id не меньше size), пропускаются.
+    """
+    if size is None:
+        top = User.objects.order_by("-id").values_list(
+            "id", flat=True
+        ).first()
+        size = (top or 0) + 1
+    table = Follow._meta.db_table
+    user_column = Follow._meta.get_field("user").column
+    author_column = Follow._meta.get_field("author").column
+    users, authors = array("i"), array("i")
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {user_column}, {author_column} FROM {table}")
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for user, author in rows:
+                if user < size and author < size:
+                    users.append(user)
+                    authors.append(author)
+    return Graph(users, authors, size)
+
+
+def suggest(graph, user, limit, popular=()):
+    """[(автор, оценка), ...] — до limit лучших кандидатов для user"""
+    followed = graph.follows(user)
+    excluded = set(followed)
+    excluded.add(user)
+    friends_of_friends = Counter()
+    similar = defaultdict(float)
+    for author in followed:
+        # Counter.update считает в C: это самый частый цикл
+        friends_of_friends.update(_sample(graph.following, author))
+        weight = 1 / math.log(2 + graph.follower_count(author))
+        for reader in _sample(graph.followers, author, READERS_CAP):
+            similar[reader] += weight
+    similar.pop(user, None)
+    scores = defaultdict(float)
+    for candidate, paths in friends_of_friends.items():
+        scores[candidate] = paths * FOF_WEIGHT
+    for reader, weight in heapq.nlargest(
+        SIMILAR_READERS, similar.items(), key=itemgetter(1)
+    ):
+        for candidate in _sample(graph.following, reader):
+            scores[candidate] += weight
+    for node in excluded:
+        scores.pop(node, None)
+    best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+    for author in popular:
+        if len(best) >= limit:
+            break
+        if author not in excluded and author not in scores:
+            # ниже любой оценки по графу
+            best.append((author, 0.0))
+    return best
+
+
+# граф для процессов-воркеров: достаётся им при fork без копирования
+_graph = None
+
+
+def _suggest_chunk(args):
+    user_ids, limit, popular = args
+    return user_ids, [
+        (user, author, score)
+        for user in user_ids
+        for author, score in suggest(_graph, user, limit, popular)
+    ]
+
+
+def build(limit=None, workers=1):
+    """Пересчитать рекомендации всех пользователей, вернуть число строк"""
+    global _graph
+    limit = limit or getattr(settings, "SUGGESTIONS_PER_USER", 10)
+    # сначала пользователи, потом граф: все id из списка попадут в массивы
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+    _graph = load_graph((user_ids[-1] + 1) if user_ids else 1)
+    popular = _graph.popular(limit * 2)
+    tasks = [
+        (user_ids[start:start + CHUNK_SIZE], limit, popular)
+        for start in range(0, len(user_ids), CHUNK_SIZE)
+    ]
+    total = 0
+    pool = None
+    if workers > 1:
+        # воркеры только считают и в базу не ходят; пишет этот процесс
+        pool = multiprocessing.get_context("fork").Pool(workers)
+        results = pool.imap(_suggest_chunk, tasks)
+    else:
+        results = map(_suggest_chunk, tasks)
+    # строк на порядок больше, чем подписок: пишутся без объектов модели;
+    # пользователи, удалённые во время расчёта, пропускаются самой вставкой
+    users = User._meta.db_table
+    insert = (
+        f"INSERT INTO {Suggestion._meta.db_table} "
+        "(user_id, author_id, score) SELECT %s, %s, %s "
+        f"WHERE EXISTS (SELECT 1 FROM {users} WHERE id = %s) "
+        f"AND EXISTS (SELECT 1 FROM {users} WHERE id = %s)"
+    )
+    try:
+        for chunk, rows in results:
+            # пользователи части получают новые рекомендации атомарно
+            with transaction.atomic(), connection.cursor() as cursor:
+                chunk_rows = Suggestion.objects.filter(
+                    user_id__gte=chunk[0], user_id__lte=chunk[-1]
+                )
+                chunk_rows.delete()
+                cursor.executemany(insert, [
+                    (user, author, score, user, author)
+                    for user, author, score in rows
+                ])
+                # rowcount у executemany не везде надёжен
+                total += chunk_rows.count()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _graph = None
+    return total
+
+
+def for_user(user, limit):
+    """Рекомендации для страницы: один запрос по индексу (user, -score);
+    авторы, на которых пользователь подписался после расчёта, отсеиваются
+    в том же запросе"""
+    return list(
+        Suggestion.objects.filter(user=user)
+        .exclude(author__following__user=user)
+        .select_related("author")
+        .order_by("-score")[:limit]
+    )
@@ -0,0 +1,13 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кеша с учётом текущего пользователя"""
+    html = cards.render_card(post)
+    return mark_safe(cards.personalize(html, post, context.get("user")))
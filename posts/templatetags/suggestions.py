@@ -0,0 +1,15 @@
+from django import template
+from django.conf import settings
+
+from posts import suggestions
+
+register = template.Library()
+
+
+@register.inclusion_tag("includes/suggestions.html")
+def suggested_authors(user):
+    """Кого почитать: готовые рекомендации одним запросом"""
+    if not user.is_authenticated:
+        return {"suggestions": []}
+    limit = getattr(settings, "SUGGESTIONS_SHOWN", 5)
+    return {"suggestions": suggestions.for_user(user, limit)}
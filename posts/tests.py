@@ -1,10 +1,44 @@
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from time import sleep, time as time_now
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection
+from django.db.models import QuerySet
+from django.template import Context, Template
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from .models import Group, Post, User, Comment, Follow
+from . import (
+    counters, feed, feed_cache, hot, images, search, suggestions, thumbnails,
+    write_behind
+)
+from .importer import Importer
+from .models import (
+    Group, GroupStats, Post, User, Comment, Follow, FeedEntry, Suggestion,
+    UserStats
+)
+from .paginator import CursorPaginator
+from yatube import metrics, nplusone, replicas
+from yatube.nplusone import NPlusOneError
+from yatube.cache import SQLiteCache
+from yatube.sqlite.base import DatabaseWrapper as SQLiteWrapper
 
 
 class TestUser(TestCase):
@@ -327,4 +361,1468 @@ class TestUser(TestCase):
                         )
                     self.assertContains(response, post_text)
             else:
-                print("not context")                    
+                print("not context")
+
+
+class TestFollowFeed(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="writer")
+        self.old_post = Post.objects.create(text="old", author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_texts(self):
+        response = self.client.get(reverse("follow_index"))
+        return [post.text for post in response.context["page"]]
+
+    def test_follow_backfills_and_new_post_fans_out(self):
+        """Подписка дозаполняет ленту, новый пост раскладывается по лентам"""
+        self.client.get(reverse("profile_follow", args=["writer"]))
+        Post.objects.create(text="new", author=self.author)
+        self.assertEqual(self.feed_texts(), ["new", "old"])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки записи автора удаляются из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse("profile_unfollow", args=["writer"]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте"""
+        fan = User.objects.create_user(username="fan")
+        with mock.patch.object(feed, "FANOUT_MAX_FOLLOWERS", 1):
+            Follow.objects.create(user=fan, author=self.author)
+            Follow.objects.create(user=self.reader, author=self.author)
+            Post.objects.create(text="new", author=self.author)
+            self.assertFalse(
+                FeedEntry.objects.filter(post__text="new").exists()
+            )
+            self.assertEqual(self.feed_texts(), ["new", "old"])
+
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Автор опустился ниже нижнего порога: посты «популярного»
+        периода раскладываются по лентам после фиксации транзакции"""
+        fans = [
+            User.objects.create_user(username=f"fan{number}")
+            for number in range(3)
+        ]
+        callbacks = []
+        with mock.patch.object(feed, "FANOUT_MAX_FOLLOWERS", 2), \
+                mock.patch.object(feed, "FANOUT_MIN_FOLLOWERS", 2), \
+                mock.patch.object(
+                    feed.transaction, "on_commit", callbacks.append
+                ), override_settings(FEED_BACKFILL_ASYNC=False):
+            for fan in fans:
+                Follow.objects.create(user=fan, author=self.author)
+            Follow.objects.create(user=self.reader, author=self.author)
+            Post.objects.create(text="celeb post", author=self.author)
+            self.assertEqual(self.feed_texts(), ["celeb post", "old"])
+            # между порогами флаг не меняется
+            for fan in fans[:2]:
+                Follow.objects.filter(user=fan).delete()
+            self.assertTrue(UserStats.objects.get(user=self.author).celebrity)
+            self.assertEqual(callbacks, [])
+            Follow.objects.filter(user=fans[2]).delete()
+            # в самом запросе отписки лента не раскладывается
+            self.assertFalse(FeedEntry.objects.filter(user=self.reader))
+            for callback in callbacks:
+                callback()
+        self.assertFalse(UserStats.objects.get(user=self.author).celebrity)
+        self.assertEqual(self.feed_texts(), ["celeb post", "old"])
+
+    def test_backfill_takes_recent_posts(self):
+        Post.objects.create(text="recent", author=self.author)
+        with mock.patch.object(feed, "BACKFILL_POSTS", 1):
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_texts(), ["recent"])
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        for number in range(25):
+            Post.objects.create(text=f"post {number}", author=self.author)
+        cache.clear()
+
+    def test_walk_forward_and_back(self):
+        """Курсоры ведут вперёд и назад по ленте без пропусков"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        texts = [post.text for page in (first, second, third) for post in page]
+        self.assertEqual(texts, [f"post {n}" for n in range(24, -1, -1)])
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.client.get(reverse("index"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "post 24")
+
+    def test_cursor_mode_skips_count(self):
+        """В курсорном режиме нет запроса COUNT"""
+        page = CursorPaginator(Post.objects.all(), 10).get_page()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("index"), {"cursor": page.next_cursor}
+            )
+        self.assertContains(response, "post 14")
+        self.assertContains(response, "?cursor=")
+        self.assertFalse(
+            any(query["sql"].startswith("SELECT COUNT(*)")
+                for query in queries.captured_queries)
+        )
+
+
+class TestFeedQueries(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="group", slug="group")
+        for number in range(12):
+            self.post = Post.objects.create(
+                text=f"post {number}", author=self.author, group=self.group
+            )
+            for commenter in (self.author, self.reader):
+                Comment.objects.create(
+                    post=self.post, author=commenter, text="comment"
+                )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.login_client = Client()
+        self.login_client.force_login(self.reader)
+        cache.clear()
+
+    def assert_queries(self, number, url, client=None):
+        client = client or self.client
+        with self.assertNumQueries(number):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_index(self):
+        # COUNT и страница постов
+        response = self.assert_queries(2, reverse("index"))
+        self.assertContains(response, "2 комментариев")
+
+    def test_group_posts(self):
+        # группа со счётчиками и страница постов; число постов — из счётчика
+        self.assert_queries(2, reverse("group", args=["group"]))
+
+    def test_profile(self):
+        # автор со счётчиками и страница постов; число постов — из счётчика
+        response = self.assert_queries(2, reverse("profile", args=["writer"]))
+        self.assertEqual(response.context["paginator"].count, 12)
+
+    def test_post_view(self):
+        # пост с автором и его счётчиками, комментарии с авторами
+        self.assert_queries(
+            2, reverse("post", args=["writer", self.post.id])
+        )
+
+    def test_follow_index(self):
+        # сессия, пользователь, популярные авторы и два запроса ленты
+        self.assert_queries(5, reverse("follow_index"), self.login_client)
+
+    def test_search(self):
+        # COUNT и страница по индексу FTS5, посты страницы
+        self.assert_queries(3, reverse("search") + "?q=post")
+
+
+class TestQueryPlans(TestCase):
+    """Запросы лент читают строки по индексу, без временной сортировки"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.post = Post.objects.create(
+            text="post", author=self.author, group=self.group
+        )
+        Comment.objects.create(post=self.post, author=self.reader, text="hi")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.login_client = Client()
+        self.login_client.force_login(self.reader)
+        cache.clear()
+
+    def query_plans(self, url, client=None):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plans[sql] = [row[-1] for row in cursor.fetchall()]
+        return plans
+
+    def assert_indexed(self, url, client=None):
+        plans = self.query_plans(url, client)
+        self.assertTrue(plans)
+        for sql, plan in plans.items():
+            for step in plan:
+                self.assertNotIn("TEMP B-TREE", step, sql)
+                if step.startswith("SCAN"):
+                    self.assertIn("USING", step, sql)
+        return plans
+
+    def test_index(self):
+        plans = self.assert_indexed(reverse("index"))
+        self.assertIn(
+            "posts_post_pub_dat_d3c0cd_idx", " ".join(sum(plans.values(), []))
+        )
+
+    def test_group_posts(self):
+        plans = self.assert_indexed(reverse("group", args=["group"]))
+        self.assertIn(
+            "posts_post_group_i_6a7ae9_idx", " ".join(sum(plans.values(), []))
+        )
+
+    def test_group_index(self):
+        plans = self.assert_indexed(reverse("group_index"))
+        self.assertIn(
+            "posts_group_posts_297015_idx", " ".join(sum(plans.values(), []))
+        )
+
+    def test_profile(self):
+        plans = self.assert_indexed(reverse("profile", args=["writer"]))
+        self.assertIn(
+            "posts_post_author__075f1d_idx", " ".join(sum(plans.values(), []))
+        )
+
+    def test_post_view(self):
+        plans = self.assert_indexed(
+            reverse("post", args=["writer", self.post.id])
+        )
+        self.assertIn(
+            "posts_comme_post_id_944a68_idx", " ".join(sum(plans.values(), []))
+        )
+
+    def test_follow_index(self):
+        self.assert_indexed(reverse("follow_index"), self.login_client)
+
+
+class TestCommentPages(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(text="post", author=self.author)
+        self.comments = [
+            Comment.objects.create(
+                post=self.post, author=self.author, text=f"comment {number}"
+            )
+            for number in range(5)
+        ]
+        self.more_url = reverse("post_comments", args=["writer", self.post.id])
+
+    @mock.patch("posts.views.COMMENTS_PER_PAGE", 2)
+    def test_post_page_shows_first_comments(self):
+        response = self.client.get(
+            reverse("post", args=["writer", self.post.id])
+        )
+        self.assertContains(response, "comment 1")
+        self.assertNotContains(response, "comment 2")
+        self.assertContains(response, 'id="more-comments"')
+        # в контексте только показанная страница, а не вся ветка
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            ["comment 0", "comment 1"],
+        )
+
+    @mock.patch("posts.views.COMMENTS_PER_PAGE", 2)
+    def test_load_more_walks_whole_thread(self):
+        texts = []
+        cursor = ""
+        while True:
+            # пост и порция комментариев с авторами
+            with self.assertNumQueries(2):
+                data = self.client.get(
+                    self.more_url, {"cursor": cursor}
+                ).json()
+            texts += [comment["text"] for comment in data["comments"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(texts, [comment.text for comment in self.comments])
+
+    def test_wrong_author_not_found(self):
+        User.objects.create_user(username="other")
+        url = reverse("post_comments", args=["other", self.post.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TestApi(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.posts = [
+            Post.objects.create(
+                text=f"post {number}", author=self.author, group=self.group
+            )
+            for number in range(3)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_lists(self):
+        self.client.force_login(self.reader)
+        for url in (
+            reverse("api_index"),
+            reverse("api_group", args=["group"]),
+            reverse("api_profile", args=["writer"]),
+            reverse("api_follow_index"),
+        ):
+            data = self.client.get(url).json()
+            self.assertEqual(
+                [post["text"] for post in data["results"]],
+                ["post 2", "post 1", "post 0"],
+                url,
+            )
+            self.assertEqual(data["results"][0]["group"]["slug"], "group")
+
+    @mock.patch("posts.api.PER_PAGE", 2)
+    def test_cursor(self):
+        data = self.client.get(reverse("api_index")).json()
+        self.assertEqual(len(data["results"]), 2)
+        data = self.client.get(
+            reverse("api_index"), {"cursor": data["next_cursor"]}
+        ).json()
+        self.assertEqual([post["text"] for post in data["results"]], ["post 0"])
+        self.assertIsNone(data["next_cursor"])
+
+    def test_not_modified(self):
+        url = reverse("api_index")
+        etag = self.client.get(url)["ETag"]
+        # страница постов, без сериализации
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text="comment"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_post_detail_not_modified(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text="comment")
+        url = reverse("api_post", args=[post.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["comments"][0]["text"], "comment")
+        # только пост, комментарии не запрашиваются
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse("api_follow_index"))
+        self.assertEqual(response.status_code, 401)
+
+
+class TestImport(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="group", slug="group")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.write(content)
+        return path
+
+    def run_import(self, *args, **options):
+        call_command(
+            "import_content", *args, stdout=StringIO(), stderr=StringIO(),
+            **options
+        )
+
+    def test_posts_comments_follows(self):
+        posts = self.write("posts.jsonl", "\n".join([
+            '{"id": 100, "author": "writer", "text": "утренняя дорога",'
+            ' "group": "group", "pub_date": "2020-01-02T10:00:00"}',
+            '{"author": "writer", "text": ""}',
+            '{"author": "nobody", "text": "lost"}',
+            '{"author": "writer", "text": "вечер"}',
+        ]))
+        self.run_import("posts", posts, batch_size=2)
+        post = Post.objects.get(id=100)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(UserStats.objects.get(user=self.author).posts, 2)
+        # производные данные: лента подписчика и поисковый индекс
+        self.assertEqual(self.reader.feed_entries.count(), 2)
+        self.assertIn(post, search.search("дороги")[:10])
+
+        comments = self.write(
+            "comments.csv",
+            "post,author,text\n100,reader,first\n100,reader,second\n"
+            "999,reader,orphan\n",
+        )
+        self.run_import("comments", comments)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        follows = self.write(
+            "follows.csv", "user,author\nwriter,reader\nreader,writer\n"
+        )
+        self.run_import("follows", follows)
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertEqual(UserStats.objects.get(user=self.reader).followers, 1)
+
+    def test_taken_and_duplicate_ids_rejected(self):
+        existing = Post.objects.create(text="есть", author=self.author)
+        saved, errors = Importer("posts").run(iter([
+            (1, {"author": "writer", "text": "авто"}),
+            (2, {"id": existing.id + 1, "author": "writer", "text": "a"}),
+            (3, {"id": existing.id + 1, "author": "writer", "text": "b"}),
+            (4, {"id": existing.id, "author": "writer", "text": "c"}),
+        ]))
+        self.assertEqual(saved, 2)
+        self.assertEqual([number for number, _ in errors], [3, 4])
+        self.assertEqual(Post.objects.get(id=existing.id + 1).text, "a")
+        self.assertEqual(Post.objects.get(id=existing.id + 2).text, "авто")
+        # повторный импорт того же файла не падает, а отклоняет записи
+        saved, errors = Importer("posts").run(iter([
+            (1, {"id": existing.id + 1, "author": "writer", "text": "a"}),
+        ]))
+        self.assertEqual((saved, len(errors)), (0, 1))
+
+    def test_checkpoint_resumes(self):
+        posts = self.write("posts.jsonl", "\n".join(
+            f'{{"author": "writer", "text": "post {number}"}}'
+            for number in range(5)
+        ))
+        checkpoint = os.path.join(self.directory.name, "checkpoint")
+        with open(checkpoint, "w") as stream:
+            stream.write("3")
+        self.run_import("posts", posts, batch_size=2, checkpoint=checkpoint)
+        self.assertEqual(
+            sorted(Post.objects.values_list("text", flat=True)),
+            ["post 3", "post 4"],
+        )
+        with open(checkpoint) as stream:
+            self.assertEqual(stream.read(), "5")
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="group", slug="group")
+        self.post = Post.objects.create(
+            text="первый", author=self.author, group=self.group
+        )
+        Post.objects.create(text="второй", author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text="hi")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compressed_jsonl(self):
+        path = os.path.join(self.directory.name, "posts.jsonl.gz")
+        call_command(
+            "export_content", "posts", path, chunk_size=1, stderr=StringIO()
+        )
+        with gzip.open(path, "rt", encoding="utf-8") as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [(record["text"], record.get("group")) for record in records],
+            [("первый", "group"), ("второй", None)],
+        )
+        self.assertEqual(records[0]["author"], "writer")
+
+    def test_stdout_matches_import_format(self):
+        for kind, expected in (
+            ("comments", {"post": self.post.id, "author": "reader"}),
+            ("follows", {"user": "reader", "author": "writer"}),
+        ):
+            stdout = StringIO()
+            call_command("export_content", kind, "-", stdout=stdout,
+                         stderr=StringIO())
+            record = json.loads(stdout.getvalue())
+            self.assertLessEqual(expected.items(), record.items())
+
+    @skipUnless(find_spec("pyarrow"), "нужен pyarrow")
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        path = os.path.join(self.directory.name, "posts.parquet")
+        call_command("export_content", "posts", path, stderr=StringIO())
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column("text").to_pylist(), ["первый", "второй"])
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        Post.objects.create(text="post", author=self.author)
+        cache.clear()
+        metrics.registry.reset()
+
+    def samples(self, text):
+        return dict(
+            line.rsplit(" ", 1) for line in text.splitlines()
+            if not line.startswith("#")
+        )
+
+    def test_per_view_stats(self):
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+        self.client.get(reverse("profile", args=["writer"]))
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+            )
+        samples = self.samples(response.content.decode())
+        self.assertEqual(
+            samples['yatube_requests_total{view="index",status="2xx"}'], "2"
+        )
+        self.assertEqual(
+            samples['yatube_request_duration_seconds_count{view="profile"}'],
+            "1",
+        )
+        self.assertEqual(
+            samples['yatube_request_duration_seconds_bucket'
+                    '{view="index",le="+Inf"}'],
+            "2",
+        )
+        self.assertGreater(
+            int(samples['yatube_db_queries_total{view="profile"}']), 0
+        )
+        self.assertGreater(
+            float(samples[
+                'yatube_template_duration_seconds_total{view="index"}'
+            ]),
+            0,
+        )
+        # первая главная строится, вторая читается из кеша ленты
+        self.assertGreater(
+            int(samples[
+                'yatube_cache_requests_total{view="index",result="hit"}'
+            ]),
+            0,
+        )
+
+    def test_protected(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+            )
+        self.assertEqual(response.status_code, 403)
+        self.author.is_staff = True
+        self.author.save()
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+
+class TestNPlusOne(TestCase):
+    """Запрос на каждую строку списка ломает тесты"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(text="post", author=self.author)
+        for number in range(6):
+            commenter = User.objects.create_user(username=f"reader{number}")
+            Comment.objects.create(
+                post=self.post, author=commenter, text="comment"
+            )
+        cache.clear()
+
+    def without_select_related(self):
+        return mock.patch.object(
+            QuerySet, "select_related", lambda self, *fields: self
+        )
+
+    def test_enabled_in_tests(self):
+        self.assertEqual(settings.NPLUSONE_MODE, "raise")
+
+    def test_code_location(self):
+        with self.assertRaisesMessage(NPlusOneError, "posts/tests.py"):
+            with nplusone.detect():
+                for comment in Comment.objects.all():
+                    comment.author.username
+
+    def test_template_location(self):
+        with self.without_select_related():
+            with self.assertRaisesMessage(
+                NPlusOneError, "шаблон includes/comments.html"
+            ):
+                self.client.get(
+                    reverse("post", args=["writer", self.post.id])
+                )
+
+    @override_settings(NPLUSONE_MODE="log", NPLUSONE_SAMPLE_RATE=1)
+    def test_logged_in_production(self):
+        with self.without_select_related():
+            with self.assertLogs("yatube.nplusone", "WARNING") as logs:
+                response = self.client.get(
+                    reverse("post", args=["writer", self.post.id])
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("includes/comments.html", logs.output[0])
+
+
+class TestWriteBehind(TestCase):
+    """Посты и комментарии пишутся пачками, автор сразу видит своё"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.client.force_login(self.author)
+        self.post = Post.objects.create(text="post", author=self.author)
+        cache.clear()
+
+    def submit_concurrently(self, batcher, objects):
+        """Отправить объекты из отдельных потоков одновременно;
+        вернуть результат или исключение каждого"""
+        results = [None] * len(objects)
+        barrier = threading.Barrier(len(objects))
+
+        def submit(index):
+            barrier.wait()
+            try:
+                results[index] = batcher.submit(objects[index])
+            except Exception as error:
+                results[index] = error
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=submit, args=[index])
+            for index in range(len(objects))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @override_settings(WRITE_BEHIND=True)
+    def test_author_sees_new_post(self):
+        response = self.client.post(
+            reverse("new_post"), {"text": "пост из очереди"}, follow=True
+        )
+        self.assertContains(response, "пост из очереди")
+        post = Post.objects.get(text="пост из очереди")
+        self.assertEqual(post.author, self.author)
+        self.assertIsNotNone(post.pub_date)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts, 2
+        )
+        self.assertIn(post, search.search("очереди")[:10])
+
+    @override_settings(WRITE_BEHIND=True)
+    def test_author_sees_new_comment(self):
+        response = self.client.post(
+            reverse("add_comment", args=["writer", self.post.id]),
+            {"text": "комментарий из очереди"}, follow=True,
+        )
+        self.assertContains(response, "комментарий из очереди")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_concurrent_writes_grouped(self):
+        batches = []
+        batcher = write_behind.Batcher(
+            lambda objects: batches.append(objects) or [], interval=0.05
+        )
+        objects = [object() for _ in range(8)]
+        results = self.submit_concurrently(batcher, objects)
+        self.assertEqual(results, objects)
+        self.assertLess(len(batches), len(objects))
+        self.assertCountEqual(sum(batches, []), objects)
+
+    def test_failed_batch_written_one_by_one(self):
+        class Record:
+            pk = None
+
+            def __init__(self, valid):
+                self.valid = valid
+
+            def save(self):
+                if not self.valid:
+                    raise ValueError("invalid")
+
+        def write(objects):
+            raise ValueError("batch")
+
+        batcher = write_behind.Batcher(write, interval=0.05)
+        good, bad = Record(True), Record(False)
+        with self.assertLogs("posts.write_behind", "ERROR"):
+            results = self.submit_concurrently(batcher, [good, bad])
+        self.assertIs(results[0], good)
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_backpressure(self):
+        """Полная очередь отказывает сразу, а не копит запросы"""
+        release = threading.Event()
+
+        def write(objects):
+            release.wait(5)
+            return []
+
+        batcher = write_behind.Batcher(
+            write, max_pending=1, interval=0, timeout=0.01
+        )
+        writers = [
+            threading.Thread(target=batcher.submit, args=[object()])
+            for _ in range(2)
+        ]
+        for thread in writers:
+            # первый пишет и ждёт, второй занимает единственное место
+            thread.start()
+            sleep(0.1)
+        with self.assertRaises(write_behind.Overloaded):
+            batcher.submit(object())
+        release.set()
+        for thread in writers:
+            thread.join()
+
+    @override_settings(WRITE_BEHIND=True)
+    def test_overloaded_response(self):
+        with mock.patch.object(
+            write_behind.Batcher, "submit",
+            side_effect=write_behind.Overloaded,
+        ):
+            response = self.client.post(
+                reverse("new_post"), {"text": "пост"}
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class TestGroupStats(TestCase):
+    """Счётчики групп меняются вместе с постами"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="Кино", slug="cinema")
+        self.other = Group.objects.create(title="Книги", slug="books")
+        cache.clear()
+
+    def stats(self, group):
+        stats = GroupStats.objects.get(group=group)
+        return stats.posts, stats.authors, stats.last_post_at
+
+    def test_new_posts(self):
+        first = Post.objects.create(
+            text="first", author=self.author, group=self.group
+        )
+        Post.objects.create(
+            text="second", author=self.author, group=self.group
+        )
+        self.assertEqual(self.stats(self.group)[:2], (2, 1))
+        last = Post.objects.create(
+            text="third", author=self.reader, group=self.group
+        )
+        self.assertEqual(
+            self.stats(self.group), (3, 2, last.pub_date)
+        )
+        self.assertLess(first.pub_date, last.pub_date)
+
+    def test_moved_and_deleted_posts(self):
+        kept = Post.objects.create(
+            text="kept", author=self.author, group=self.group
+        )
+        moved = Post.objects.create(
+            text="moved", author=self.reader, group=self.group
+        )
+        moved.group = self.other
+        moved.save()
+        self.assertEqual(self.stats(self.group), (1, 1, kept.pub_date))
+        self.assertEqual(self.stats(self.other), (1, 1, moved.pub_date))
+        kept.delete()
+        self.assertEqual(self.stats(self.group), (0, 0, None))
+
+    def test_import_updates_stats(self):
+        records = [
+            (1, {"author": "writer", "text": "a", "group": "cinema"}),
+            (2, {"author": "reader", "text": "b", "group": "cinema"}),
+            (3, {"author": "reader", "text": "c", "group": "books"}),
+        ]
+        Importer("posts").run(iter(records))
+        self.assertEqual(self.stats(self.group)[:2], (2, 2))
+        self.assertEqual(self.stats(self.other)[:2], (1, 1))
+
+    def test_reconcile(self):
+        Post.objects.create(text="post", author=self.author, group=self.group)
+        GroupStats.objects.filter(group=self.group).update(posts=10)
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(self.stats(self.group)[:2], (1, 1))
+
+    def test_directory(self):
+        Post.objects.create(text="post", author=self.author, group=self.other)
+        # COUNT и страница счётчиков с группами
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("group_index"))
+        self.assertEqual(
+            [stats.group for stats in response.context["page"]],
+            [self.other, self.group],
+        )
+        self.assertContains(response, "Записей: 1 · авторов: 1")
+
+    def test_group_page_cached_until_new_post(self):
+        url = reverse("group", args=["cinema"])
+        self.client.get(url)
+        # только группа со счётчиками, страница постов — из кеша
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        Post.objects.create(
+            text="свежий пост", author=self.author, group=self.group
+        )
+        response = self.client.get(url)
+        self.assertContains(response, "свежий пост")
+        self.assertContains(response, "Записей: 1 · авторов: 1")
+
+
+class TestHotPosts(TestCase):
+    """Рейтинг «Популярного» обновляется вместе с комментариями"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+
+    def scores(self):
+        return dict(Post.objects.values_list("id", "hot_score"))
+
+    def assertScoresRebuilt(self):
+        # пошаговые обновления дают то же, что и пересчёт с нуля
+        incremental = self.scores()
+        hot.rebuild()
+        for post_id, score in self.scores().items():
+            self.assertAlmostEqual(incremental[post_id], score, places=6)
+
+    def test_comments_raise_post(self):
+        commented = Post.objects.create(text="обсуждаемый", author=self.author)
+        fresh = Post.objects.create(text="свежий", author=self.author)
+        self.assertLess(commented.hot_score, fresh.hot_score)
+        for number in range(3):
+            Comment.objects.create(
+                post=commented, author=self.reader, text=f"ответ {number}"
+            )
+        # COUNT по первым HOT_POSTS и страница
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("hot_index"))
+        self.assertEqual(list(response.context["page"]), [commented, fresh])
+        self.assertScoresRebuilt()
+
+    def test_old_activity_decays(self):
+        old = Post.objects.create(text="позавчерашний", author=self.author)
+        for number in range(5):
+            Comment.objects.create(post=old, author=self.reader, text="+")
+        two_days_ago = old.pub_date - timedelta(days=2)
+        Post.objects.filter(pk=old.pk).update(pub_date=two_days_ago)
+        Comment.objects.update(created=two_days_ago)
+        hot.rebuild()
+        # пост и пять комментариев двухдневной давности (четыре периода
+        # полураспада) весят меньше одного свежего поста: 6 · 2⁻⁴ < 1
+        new = Post.objects.create(text="новый", author=self.author)
+        self.assertEqual(list(hot.hot_posts()), [new, old])
+
+    def test_followers_raise_post(self):
+        for number in range(10):
+            follower = User.objects.create_user(username=f"fan{number}")
+            Follow.objects.create(user=follower, author=self.author)
+        popular = Post.objects.create(text="у автора есть читатели",
+                                      author=self.author)
+        unknown = Post.objects.create(text="у автора нет читателей",
+                                      author=self.reader)
+        self.assertEqual(list(hot.hot_posts()), [popular, unknown])
+        self.assertScoresRebuilt()
+
+    def test_imported_comments(self):
+        post = Post.objects.create(text="пост", author=self.author)
+        Importer("comments").run(iter([
+            (1, {"post": post.id, "author": "reader", "text": "a",
+                 "created": "2026-01-01T10:00:00"}),
+            (2, {"post": post.id, "author": "reader", "text": "b"}),
+        ]))
+        self.assertGreater(self.scores()[post.id], post.hot_score)
+        self.assertScoresRebuilt()
+
+
+class TestSuggestions(TestCase):
+    """Рекомендации «кого читать» по графу подписок"""
+
+    def setUp(self):
+        names = ["reader", "friend", "twin", "star", "hidden", "newcomer"]
+        self.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+
+    def follow(self, user, author):
+        Follow.objects.create(user=self.users[user], author=self.users[author])
+
+    def suggested(self, name):
+        return [
+            suggestion.author.username
+            for suggestion in Suggestion.objects.filter(
+                user=self.users[name]
+            ).select_related("author").order_by("-score")
+        ]
+
+    def test_friends_of_friends_and_co_follows(self):
+        self.follow("reader", "friend")
+        # друг друга
+        self.follow("friend", "star")
+        # похожий читатель: тоже читает friend, а ещё hidden
+        self.follow("twin", "friend")
+        self.follow("twin", "hidden")
+        self.follow("twin", "star")
+        suggestions.build()
+        suggested = self.suggested("reader")
+        # star — и друг друга, и у похожего читателя
+        self.assertEqual(suggested[:2], ["star", "hidden"])
+        self.assertNotIn("reader", suggested)
+        self.assertNotIn("friend", suggested)
+
+    def test_popular_authors_for_newcomers(self):
+        for name in ("reader", "twin", "hidden"):
+            self.follow(name, "star")
+        self.follow("reader", "friend")
+        suggestions.build(limit=2)
+        self.assertEqual(self.suggested("newcomer"), ["star", "friend"])
+
+    def test_workers_give_same_result(self):
+        self.follow("reader", "friend")
+        self.follow("friend", "star")
+        self.follow("twin", "friend")
+        self.follow("twin", "hidden")
+        suggestions.build()
+        single = {name: self.suggested(name) for name in self.users}
+        total = suggestions.build(workers=2)
+        self.assertEqual(total, Suggestion.objects.count())
+        self.assertEqual(
+            {name: self.suggested(name) for name in self.users}, single
+        )
+
+    def test_users_changed_during_build(self):
+        """Регистрация и удаление пользователей во время расчёта"""
+        self.follow("reader", "friend")
+        self.follow("friend", "star")
+        self.follow("friend", "hidden")
+        load_graph = suggestions.load_graph
+
+        def racing_load_graph(size):
+            late = User.objects.create_user(username="late")
+            Follow.objects.create(user=late, author=self.users["star"])
+            self.users["hidden"].delete()
+            return load_graph(size)
+
+        with mock.patch.object(
+            suggestions, "load_graph", side_effect=racing_load_graph
+        ):
+            total = suggestions.build()
+        self.assertEqual(total, Suggestion.objects.count())
+        self.assertEqual(self.suggested("reader"), ["star"])
+
+    def test_rendered_with_one_query(self):
+        self.follow("reader", "friend")
+        self.follow("friend", "star")
+        self.follow("friend", "hidden")
+        suggestions.build()
+        # подписка после расчёта: автор пропадает из рекомендаций сразу
+        self.follow("reader", "hidden")
+        template = Template(
+            "{% load suggestions %}{% suggested_authors user %}"
+        )
+        with self.assertNumQueries(1):
+            html = template.render(Context({"user": self.users["reader"]}))
+        self.assertIn("@star", html)
+        self.assertNotIn("@hidden", html)
+        client = Client()
+        client.force_login(self.users["reader"])
+        response = client.get(reverse("profile", args=["friend"]))
+        self.assertContains(response, "Рекомендуем почитать")
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.post = Post.objects.create(text="post", author=self.author)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с подписками, постами и комментариями"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text="c")
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual(self.author.stats.followers, 1)
+        self.assertEqual(self.author.stats.posts, 1)
+        self.assertEqual(self.reader.stats.following, 1)
+        self.assertEqual(self.post.comment_count, 1)
+        follow.delete()
+        self.post.delete()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers, 0)
+        self.assertEqual(self.author.stats.posts, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_counters исправляет разошедшиеся счётчики"""
+        UserStats.objects.filter(user=self.author).update(posts=42)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        call_command("reconcile_counters", stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.author).posts, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_missing_row_is_created_on_read(self):
+        """Профиль пользователя без строки счётчиков открывается"""
+        UserStats.objects.filter(user=self.author).delete()
+        response = self.client.get(reverse("profile", args=["writer"]))
+        self.assertContains(response, "Записей: 1")
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.morning = Post.objects.create(
+            text="Утром я проснулся рано", author=self.author
+        )
+        self.evening = Post.objects.create(
+            text="Вечер был тихим, а утро было ещё тише. Утро, утро!",
+            author=self.author
+        )
+
+    def found(self, keyword):
+        response = self.client.get(reverse("search"), {"q": keyword})
+        return [post.id for post in response.context["page"]]
+
+    def test_word_forms_and_ranking(self):
+        """Находятся разные формы слова, частые совпадения выше"""
+        self.assertEqual(
+            self.found("утро"), [self.evening.id, self.morning.id]
+        )
+        self.assertEqual(self.found("тихий вечер"), [self.evening.id])
+        self.assertEqual(self.found('"); DROP'), [])
+
+    def test_snippet_highlights_matches(self):
+        response = self.client.get(reverse("search"), {"q": "проснулась"})
+        self.assertContains(response, "<mark>проснулся</mark>")
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста"""
+        self.morning.text = "Днём я проснулся поздно"
+        self.morning.save()
+        self.assertEqual(self.found("утро"), [self.evening.id])
+        self.evening.delete()
+        self.assertEqual(self.found("утро"), [])
+        self.assertEqual(self.found("поздний"), [self.morning.id])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM posts_post_fts")
+        self.assertEqual(self.found("утро"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.found("утро")), 2)
+
+
+class TestPostCards(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(title="Old title", slug="group")
+        self.post = Post.objects.create(
+            text="original", author=self.author, group=self.group
+        )
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        cache.clear()
+
+    def test_card_is_cached_until_version_changes(self):
+        """Карточка берётся из кеша, пока пост не изменён"""
+        self.client.get(reverse("group", args=["group"]))
+        Post.objects.filter(pk=self.post.pk).update(text="silent change")
+        response = self.client.get(reverse("group", args=["group"]))
+        self.assertContains(response, "original")
+        self.author_client.post(
+            reverse("post_edit", args=["writer", self.post.id]),
+            {"text": "edited", "group": self.group.id}
+        )
+        response = self.client.get(reverse("group", args=["group"]))
+        self.assertContains(response, "edited")
+
+    def test_comment_and_group_rename_invalidate(self):
+        self.client.get(reverse("group", args=["group"]))
+        self.author_client.post(
+            reverse("add_comment", args=["writer", self.post.id]),
+            {"text": "comment"}
+        )
+        self.group.title = "New title"
+        self.group.save()
+        response = self.client.get(reverse("group", args=["group"]))
+        self.assertContains(response, "1 комментариев")
+        self.assertContains(response, "#New title")
+
+    def test_edit_link_only_for_author(self):
+        """Общая карточка показывает ссылку на правку только автору"""
+        edit_url = reverse("post_edit", args=["writer", self.post.id])
+        response = self.client.get(reverse("group", args=["group"]))
+        self.assertNotContains(response, edit_url)
+        response = self.author_client.get(reverse("group", args=["group"]))
+        self.assertContains(response, edit_url)
+
+
+class TestFeedCache(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        Post.objects.create(text="first", author=self.author)
+        cache.clear()
+
+    def test_cached_index_needs_one_query(self):
+        self.client.get(reverse("index"))
+        # COUNT и OFFSET из кеша, посты страницы — по первичному ключу
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(len(response.context["page"]), 1)
+        self.assertEqual(response.context["paginator"].count, 1)
+
+    def test_cached_page_shows_new_comments(self):
+        self.client.get(reverse("index"))
+        Comment.objects.create(
+            post=Post.objects.get(), author=self.author, text="ответ"
+        )
+        self.assertContains(
+            self.client.get(reverse("index")), "1 комментариев"
+        )
+
+    def test_page_params_normalized(self):
+        """Мусор в ?page= и ?cursor= не порождает новых ключей кеша"""
+        self.client.get(reverse("index"))
+        for page in ("abc", "0", "-3", "01"):
+            with self.assertNumQueries(1):
+                self.client.get(reverse("index"), {"page": page})
+        self.client.get(reverse("index"), {"cursor": ""})
+        with self.assertNumQueries(1):
+            self.client.get(reverse("index"), {"cursor": "broken"})
+        response = self.client.get(reverse("index"), {"page": 999})
+        self.assertEqual(response.context["page"].number, 1)
+        key = f"feed-cache:{feed_cache.generation()}:index:10:page:999"
+        self.assertIsNone(cache.get(key))
+
+    def test_new_post_invalidates_immediately(self):
+        self.client.get(reverse("index"))
+        Post.objects.create(text="second", author=self.author)
+        self.assertContains(self.client.get(reverse("index")), "second")
+
+    def test_stale_value_served_while_other_worker_rebuilds(self):
+        """Пока пересчёт идёт в другом процессе, отдаётся старая версия"""
+        feed_cache.get_or_build("page", lambda: "old")
+        key = f"feed-cache:{feed_cache.generation()}:page"
+        expired = time_now() + feed_cache.FRESH_SECONDS + 1
+        with mock.patch("posts.feed_cache.time.time", return_value=expired):
+            cache.add(f"{key}:lock", 1)
+            self.assertEqual(
+                feed_cache.get_or_build("page", lambda: "new"), "old"
+            )
+            cache.delete(f"{key}:lock")
+            self.assertEqual(
+                feed_cache.get_or_build("page", lambda: "new"), "new"
+            )
+
+    def test_miss_waits_for_the_lock_holder(self):
+        """При промахе процесс ждёт результат, а не строит страницу сам"""
+        key = f"feed-cache:{feed_cache.generation()}:page"
+        cache.add(f"{key}:lock", 1)
+
+        def other_worker_finishes(seconds):
+            cache.set(key, (time_now() + 60, "built elsewhere"))
+
+        build = mock.Mock(return_value="built here")
+        with mock.patch(
+            "posts.feed_cache.time.sleep", side_effect=other_worker_finishes
+        ):
+            value = feed_cache.get_or_build("page", build)
+        self.assertEqual(value, "built elsewhere")
+        build.assert_not_called()
+
+
+class TestReplicas(TestCase):
+    """Страницы чтения идут на реплику, автор после записи — в default"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(text="post", author=self.author)
+        cache.clear()
+
+    def routed_reads(self, method, url, data=None):
+        """Ответ и базы, выбранные роутером для чтения моделей posts"""
+        decisions = []
+        db_for_read = replicas.ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            if model._meta.app_label == "posts":
+                decisions.append(db_for_read(router, model, **hints))
+            # реплики в тестах нет: сам запрос идёт в default
+            return "default"
+
+        with mock.patch.object(
+            replicas.ReplicaRouter, "db_for_read", record
+        ), override_settings(REPLICAS=["replica1"]):
+            response = getattr(self.client, method)(url, data)
+        return response, set(decisions)
+
+    def test_read_views_use_replica(self):
+        for url in (reverse("profile", args=["writer"]),
+                    reverse("post", args=["writer", self.post.id])):
+            response, databases = self.routed_reads("get", url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(databases, {"replica1"})
+
+    def test_shared_feed_cache_built_from_primary(self):
+        """Общую страницу в кеше не строят по отстающей реплике"""
+        _, databases = self.routed_reads("get", reverse("index"))
+        self.assertEqual(databases, {"default"})
+
+    def test_other_views_use_primary(self):
+        self.client.force_login(self.author)
+        _, databases = self.routed_reads("get", reverse("follow_index"))
+        self.assertEqual(databases, {"default"})
+
+    def test_author_pinned_after_write(self):
+        self.client.force_login(self.author)
+        response, databases = self.routed_reads(
+            "post", reverse("add_comment", args=["writer", self.post.id]),
+            {"text": "комментарий"},
+        )
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(databases, {"default"})
+        response, databases = self.routed_reads(
+            "get", reverse("post", args=["writer", self.post.id])
+        )
+        self.assertContains(response, "комментарий")
+        self.assertEqual(databases, {"default"})
+        self.client.cookies[replicas.PIN_COOKIE] = "0"
+        _, databases = self.routed_reads(
+            "get", reverse("post", args=["writer", self.post.id])
+        )
+        self.assertEqual(databases, {"replica1"})
+
+    def test_pinned_when_write_done_by_other_thread(self):
+        """При групповой записи INSERT делает поток лидера пачки"""
+        self.client.force_login(self.author)
+        with mock.patch.object(write_behind, "save"):
+            response, _ = self.routed_reads(
+                "post", reverse("new_post"), {"text": "пост"}
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class TestSyncReplicas(TransactionTestCase):
+    """Резервное копирование не ждёт транзакцию TestCase"""
+
+    def test_sync_replicas(self):
+        author = User.objects.create_user(username="writer")
+        Post.objects.create(text="post", author=author)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "replica.sqlite3")
+            call_command("sync_replicas", path, stdout=StringIO())
+            replica = sqlite3.connect(path)
+            try:
+                texts = replica.execute(
+                    "SELECT text FROM posts_post"
+                ).fetchall()
+            finally:
+                replica.close()
+        self.assertEqual(texts, [("post",)])
+
+
+class TestSQLiteBackend(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make_connection(self, **options):
+        wrapper = SQLiteWrapper({
+            **settings.DATABASES["default"],
+            "NAME": os.path.join(self.directory.name, "db.sqlite3"),
+            "OPTIONS": options,
+        })
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        wrapper = self.make_connection(init_command="PRAGMA user_version = 7")
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 5000)
+        self.assertEqual(self.pragma(wrapper, "temp_store"), 2)
+        self.assertEqual(self.pragma(wrapper, "user_version"), 7)
+
+    def test_immediate_transactions(self):
+        wrapper = self.make_connection(transaction_mode="immediate")
+        with CaptureQueriesContext(wrapper) as queries:
+            wrapper._start_transaction_under_autocommit()
+        self.assertTrue(wrapper.connection.in_transaction)
+        wrapper.connection.rollback()
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+    def test_connection_not_shared_after_fork(self):
+        wrapper = self.make_connection()
+        wrapper.ensure_connection()
+        inherited = wrapper.connection
+        wrapper.pid = -1
+        wrapper.ensure_connection()
+        self.assertIsNot(wrapper.connection, inherited)
+
+
+class TestSQLiteCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite3")
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **options):
+        options.setdefault("MAX_ENTRIES", 10)
+        options.setdefault("STATS_FLUSH_SECONDS", 0)
+        return SQLiteCache(self.path, {"OPTIONS": options})
+
+    def test_shared_between_instances(self):
+        """Запись одного «процесса» видна другому, add() атомарен"""
+        other = self.make_cache()
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(other.get("key"), {"value": 1})
+        self.assertFalse(other.add("key", "other"))
+        self.cache.delete("key")
+        self.assertTrue(other.add("key", "other"))
+        self.assertEqual(self.cache.get_many(["key", "missing"]),
+                         {"key": "other"})
+        self.cache.set("counter", 1)
+        self.assertEqual(other.incr("counter"), 2)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set("key", "value", timeout=0)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", "new"))
+
+    def test_lru_eviction_and_stats(self):
+        """Вытесняются давно не читавшиеся записи"""
+        lru = self.make_cache(ACCESS_RESOLUTION=0, CULL_FREQUENCY=2)
+        for number in range(10):
+            lru.set(f"key{number}", number)
+        lru.get("key0")
+        lru.set("key10", 10)
+        self.assertEqual(lru.get("key0"), 0)
+        self.assertIsNone(lru.get("key1"))
+        stats = lru.stats()
+        self.assertEqual(stats["entries"], 6)
+        self.assertEqual(stats["evictions"], 5)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_size_limit(self):
+        small = self.make_cache(MAX_SIZE=1000, MAX_ENTRIES=1000)
+        for number in range(20):
+            small.set(f"key{number}", "x" * 200)
+        self.assertLessEqual(small.stats()["size"], 1000)
+
+
+def png_upload(name="picture.png", color="red"):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("RGB", (40, 20), color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), "image/png")
+
+
+class TestThumbnails(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(
+            text="picture", author=self.author, image=png_upload()
+        )
+        cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def test_original_shown_while_pending(self):
+        """Пока миниатюры нет, карточка показывает исходную картинку"""
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, self.post.image.url)
+
+    def test_generated_thumbnail_replaces_original(self):
+        url = thumbnails.generate(self.post.id)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, url)
+        self.assertEqual(self.post.version, 2)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, f'src="{url}"')
+        self.assertFalse(thumbnails.pending().exists())
+
+    def test_variants_in_srcset(self):
+        """Карточка перечисляет варианты всех ширин и форматов"""
+        thumbnails.generate(self.post.id)
+        self.post.refresh_from_db()
+        variants = images.loads(self.post.image_variants)
+        self.assertIn("JPEG", variants)
+        self.assertIn("WEBP", variants)
+        self.assertEqual(
+            [width for width, _ in variants["JPEG"]], list(images.WIDTHS)
+        )
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'type="image/webp"')
+        for width, url in variants["WEBP"]:
+            self.assertContains(response, f"{url} {width}w")
+
+    def test_regeneration_removes_old_variants(self):
+        thumbnails.generate(self.post.id)
+        self.post.refresh_from_db()
+        old = images.loads(self.post.image_variants)
+        thumbnails.generate(self.post.id)
+        for _, url in old["JPEG"]:
+            name = url[len(settings.MEDIA_URL):]
+            self.assertFalse(default_storage.exists(name))
+
+    def test_new_image_resets_thumbnail(self):
+        thumbnails.generate(self.post.id)
+        self.post.refresh_from_db()
+        self.post.image = png_upload("other.png", "blue")
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, "")
+        self.assertTrue(thumbnails.pending().exists())
+        call_command(
+            "generate_thumbnails", workers=1, stdout=StringIO()
+        )
+        self.assertFalse(thumbnails.pending().exists())
+
@@ -0,0 +1,105 @@
+"""Миниатюры картинок постов готовятся вне запроса.
+
+Раньше sorl-thumbnail резал картинку при первой отрисовке карточки —
+первый зритель ждал декодирования и масштабирования. Теперь после
+сохранения поста с новой картинкой задача уходит в пул потоков, а
+готовые варианты (posts/images.py) записываются в Post.image_variants,
+самый крупный JPEG — в Post.thumbnail. Пока миниатюры нет, карточка
+показывает исходную картинку, вписанную по размеру.
+
+Задачи живут в памяти процесса: если процесс завершится раньше, чем
+миниатюра готова, её доделает ``manage.py generate_thumbnails``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+
+from . import images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "THUMBNAIL_WORKERS", 2),
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+def generate(post_id):
+    """Сделать варианты картинки поста и сохранить их; вернуть адрес
+    миниатюры для <img src>"""
+    from . import feed_cache
+
+    post = Post.objects.filter(pk=post_id).only(
+        "id", "image", "image_variants"
+    ).first()
+    if post is None or not post.image:
+        return None
+    old_variants = images.loads(post.image_variants)
+    variants = images.build(post.image, post_id)
+    url = variants["JPEG"][-1][1]
+    # картинку могли сменить, пока шла обработка — тогда адрес не пишем
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=url,
+        image_variants=images.dumps(variants),
+        version=F("version") + 1,
+    )
+    if not updated:
+        images.delete(variants)
+        return None
+    if old_variants != variants:
+        images.delete(_unused(old_variants, variants))
+    feed_cache.invalidate()
+    return url
+
+
+def _unused(old_variants, variants):
+    """Варианты из old_variants, которых нет среди новых"""
+    current = {url for urls in variants.values() for _, url in urls}
+    return {
+        kind: [[width, url] for width, url in urls if url not in current]
+        for kind, urls in old_variants.items()
+    }
+
+
+def _run(post_id):
+    close_old_connections()
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception("Не удалось сделать миниатюру поста %s", post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post_id):
+    """Поставить миниатюру в очередь после фиксации транзакции"""
+    if not getattr(settings, "THUMBNAIL_ASYNC", True):
+        transaction.on_commit(lambda: _run_sync(post_id))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, post_id))
+
+
+def _run_sync(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception("Не удалось сделать миниатюру поста %s", post_id)
+
+
+def pending(refresh=False):
+    """Посты с картинкой, для которых миниатюра или варианты ещё не
+    готовы; refresh — все посты с картинкой (пересобрать заново)"""
+    posts = Post.objects.exclude(image="").exclude(image=None)
+    if refresh:
+        return posts
+    return posts.filter(Q(thumbnail="") | Q(image_variants=""))
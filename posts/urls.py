@@ -1,10 +1,23 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
+    # JSON API лент, см. posts/api.py
+    path("api/posts/", api.index, name="api_index"),
+    path("api/posts/<int:post_id>/", api.post_detail, name="api_post"),
+    path(
+        "api/posts/<int:post_id>/comments/",
+        api.post_comments,
+        name="api_post_comments"
+    ),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group"),
+    path("api/users/<str:username>/", api.profile, name="api_profile"),
+    path("api/follow/", api.follow_index, name="api_follow_index"),
     path("", views.index, name="index"),
+    path("hot/", views.hot_index, name="hot_index"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
+    path("groups/", views.group_index, name="group_index"),
     path("posts_in_range_date/", views.posts_in_range_date, name="test"),
     path("search/", views.search, name="search"),
     path("new/", views.new_post, name="new_post"),
@@ -23,6 +36,11 @@ urlpatterns = [
     path("<str:username>/", views.profile, name="profile"),
     # Просмотр записи
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
+    path(
+        "<str:username>/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments"
+    ),
     path(
         "<str:username>/<int:post_id>/edit/", 
         views.post_edit, 
@@ -2,12 +2,21 @@ import datetime
 
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from . import hot, write_behind
+from .api import comment_data
+from .feed import follow_feed
+from .feed_cache import cached_page
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Comment, Follow
+from .counters import get_group_stats, get_stats
+from .models import Group, GroupStats, Post, User, Comment, Follow
+from .paginator import CursorPaginator, paginate
+from .search import search as search_posts, snippet
+
+COMMENTS_PER_PAGE = 50
+COMMENTS_ORDERING = ("created", "id")
 
 
 def page_not_found(request, exception):
@@ -27,74 +36,139 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
-@cache_page(20)
+def overloaded():
+    """Очередь записи переполнена: повторить через секунду"""
+    response = HttpResponse(
+        "Слишком много записей, повторите позже", status=503
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
 def index(request):
     """Главная страница"""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)  # показывать по 10 записей на странице.
-    page_number = request.GET.get("page")  # переменная в URL с номером запрошенной страницы
-    page = paginator.get_page(page_number)  # получить записи с нужным смещением
+    post_list = Post.objects.for_feed()
+    # показывать по 10 записей на странице, по номеру или по курсору;
+    # страница общая для всех пользователей и берётся из кеша ленты
+    paginator, page = cached_page(request, "index", post_list, 10)
     context = {"page": page, "paginator": paginator}
     return render(request, "index.html", context)
 
 
+def hot_index(request):
+    """Популярное: посты с наибольшим затухающим рейтингом (posts/hot.py)"""
+    paginator = Paginator(hot.hot_posts(), 10)
+    page = paginator.get_page(request.GET.get("page"))
+    return render(
+        request, "hot.html", {"page": page, "paginator": paginator, "hot": True}
+    )
+
+
 def group_posts(request, slug):
     """Все посты выбранной группы"""
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")  # переменная в URL с номером запрошенной страницы
-    page = paginator.get_page(page_number)  # получить записи с нужным смещением
+    group = get_object_or_404(Group.objects.select_related("stats"), slug=slug)
+    stats = get_group_stats(group)
+    post_list = group.posts.for_feed()
+    # страницы группы — из общего кеша лент, число постов — из счётчика
+    paginator, page = cached_page(
+        request, f"group:{group.id}", post_list, 10, count=stats.posts
+    )
     return render(
         request, 
         "group.html", 
-        {"group": group, "page": page, "paginator": paginator}
+        {"group": group, "stats": stats, "page": page, "paginator": paginator}
         )
 
 
+def group_index(request):
+    """Каталог групп: сначала группы с наибольшим числом постов"""
+    group_list = GroupStats.objects.select_related("group").order_by(
+        "-posts", "group"
+    )
+    paginator = Paginator(group_list, 20)
+    page = paginator.get_page(request.GET.get("page"))
+    return render(
+        request, "groups.html", {"page": page, "paginator": paginator}
+    )
+
+
 def profile(request, username):
     """Страница профиля"""
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 3)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    my_user = request.user
-    following = Follow.objects.filter(author=author).count()
-    follower = Follow.objects.filter(user=author).count()
+    author = get_object_or_404(
+        User.objects.select_related("stats"), 
+        username=username
+    )
+    stats = get_stats(author)
+    post_list = author.posts.for_feed()
+    # число постов уже есть в счётчиках профиля: без отдельного COUNT
+    paginator, page = paginate(request, post_list, 3, count=stats.posts)
     context = {
         "author": author,
         "page": page,
         "paginator": paginator,
-        "posts": post_list,
-        "following": following,
-        "follower": follower,
+        "stats": stats,
+        "following": stats.followers,
+        "follower": stats.following,
         }
     return render(request, "profile.html", context)
 
  
 def post_view(request, username, post_id):
     """Просмотр поста"""
-    post = Post.objects.get(id=post_id)
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    # автор со счётчиками приходит тем же запросом, что и пост
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related("author__stats"), id=post_id
+    )
+    author = post.author
+    if author.username != username:
+        author = get_object_or_404(
+            User.objects.select_related("stats"),
+            username=username
+        )
     form = CommentForm(request.POST or None)
-    items = post.comments.all()
-    following = Follow.objects.filter(author=author).count()
-    follower = Follow.objects.filter(user=author).count()
+    # на странице только первые комментарии, остальные подгружаются
+    # через post_comments по курсору
+    items = CursorPaginator(
+        post.comments.select_related("author"),
+        COMMENTS_PER_PAGE,
+        COMMENTS_ORDERING,
+    ).get_page(request.GET.get("comments"))
+    stats = get_stats(author)
     context = {
         "author": author,
         "username": post.author,
         "post": post,
-        "posts": post_list,
         "form": form,
+        # комментарии показанной страницы, а не всей ветки: ленивый
+        # queryset для шаблонов, которые ждут QuerySet, шаблон поста
+        # выводит items
+        "comments": post.comments.filter(
+            pk__in=[item.pk for item in items]
+        ),
         "items": items,
-        "following": following,
-        "follower": follower,
+        "stats": stats,
+        "following": stats.followers,
+        "follower": stats.following,
         }
     return render(request, "post.html", context)
 
 
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев поста в JSON"""
+    post = get_object_or_404(
+        Post, id=post_id, author__username=username
+    )
+    page = CursorPaginator(
+        post.comments.select_related("author"),
+        COMMENTS_PER_PAGE,
+        COMMENTS_ORDERING,
+    ).get_page(request.GET.get("cursor"))
+    return JsonResponse({
+        "comments": [comment_data(comment) for comment in page],
+        "next_cursor": page.next_cursor,
+    })
+
+
 @login_required
 def post_edit(request, username, post_id):
     """Не забудьте проверить, что текущий пользователь — это автор записи.
@@ -124,7 +198,10 @@ def new_post(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        try:
+            write_behind.save(post)
+        except write_behind.Overloaded:
+            return overloaded()
         return redirect("index")
     return render(request, "new_post.html", {"form": form})
 
@@ -138,7 +215,10 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        try:
+            write_behind.save(comment)
+        except write_behind.Overloaded:
+            return overloaded()
         return redirect("post", username=username, post_id=post_id)
     return redirect("post", username=username, post_id=post_id)    
     
@@ -146,10 +226,8 @@ def add_comment(request, username, post_id):
 @login_required
 def follow_index(request):
     """Страница из избранными авторами"""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)  
-    page_number = request.GET.get("page")  
-    page = paginator.get_page(page_number) 
+    post_list = follow_feed(request.user).for_feed()
+    paginator, page = paginate(request, post_list, 10)
     context = {"page": page, "paginator": paginator}
     return render(request, "follow.html", context)
 
@@ -195,9 +273,14 @@ def posts_in_range_date(request):
 def search(request):
     """Поиск по тексту постов"""
     keyword = request.GET.get("q", None)
-    posts = Post.objects.select_related("author", "group").all()
-    if keyword:
-        posts = posts.filter(text__icontains=keyword)      
-    else:
-        posts = posts.none()
-    return render(request, "search.html", {"posts": posts, "keyword": keyword})    
+    posts = search_posts(keyword) if keyword else Post.objects.none()
+    paginator = Paginator(posts, 10)
+    page = paginator.get_page(request.GET.get("page"))
+    for post in page:
+        post.snippet = snippet(post.text, keyword)
+    context = {
+        "page": page, 
+        "paginator": paginator, 
+        "keyword": keyword,
+        }
+    return render(request, "search.html", context)
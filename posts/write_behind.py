@@ -0,0 +1,176 @@
+"""Групповая запись новых постов и комментариев при всплесках.
+
+На SQLite все записи идут через одну блокировку базы: при всплеске
+одиночные INSERT, каждый в своей транзакции, выстраиваются в очередь
+на блокировку и фиксацию. С WRITE_BEHIND = True new_post и add_comment
+не пишут сами, а ставят объект в очередь процесса. Первый запрос,
+заставший очередь без писателя, становится писателем: ждёт
+WRITE_BEHIND_INTERVAL секунд, пока подойдут соседние запросы, и пишет
+накопившееся (до WRITE_BEHIND_BATCH_SIZE объектов) одной транзакцией
+через bulk_create — с теми же производными данными, что при импорте
+(поиск, ленты, счётчики). Остальные запросы ждут своей пачки.
+
+Запрос возвращается только после фиксации своего объекта, поэтому
+страница, на которую автор попадает после редиректа, уже показывает
+новый пост или комментарий. Очередь ограничена WRITE_BEHIND_MAX_PENDING:
+если места нет дольше WRITE_BEHIND_TIMEOUT секунд, save бросает
+Overloaded, и view отвечает 503 с Retry-After.
+
+Если пачка не записалась целиком, её объекты пишутся по одному обычным
+save(), и ошибка достаётся только своему запросу. Посты с картинками
+пишутся сразу: загрузка файла и миниатюры дороже транзакции.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from . import feed_cache
+from .importer import write_comments, write_posts
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Очередь записи переполнена: клиенту стоит повторить позже"""
+
+
+class _Item:
+    __slots__ = ("obj", "done", "error")
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.done = False
+        self.error = None
+
+
+class Batcher:
+    """Очередь объектов одной модели, которые пишутся пачками.
+
+    write(объекты) пишет пачку внутри транзакции и возвращает список
+    отклонённых (объект, исключение для его запроса)."""
+
+    def __init__(self, write, max_pending=1000, batch_size=100,
+                 interval=0.002, timeout=1.0):
+        self.write = write
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._pending = []
+        self._writing = False
+
+    def submit(self, obj):
+        """Записать obj в ближайшей пачке и вернуть его после фиксации"""
+        item = _Item(obj)
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: len(self._pending) < self.max_pending, self.timeout
+            ):
+                raise Overloaded(f"в очереди {len(self._pending)} записей")
+            self._pending.append(item)
+            while self._writing and not item.done:
+                self._condition.wait()
+            leader = not item.done
+            if leader:
+                self._writing = True
+        if leader:
+            self._lead(item)
+        if item.error is not None:
+            raise item.error
+        return obj
+
+    def _lead(self, item):
+        """Писать пачки, пока не записан объект самого писателя; потом
+        уступить место следующему ждущему запросу"""
+        try:
+            time.sleep(self.interval)
+            while not item.done:
+                with self._condition:
+                    batch = self._pending[:self.batch_size]
+                    del self._pending[:self.batch_size]
+                    # освободилось место для ждущих в submit
+                    self._condition.notify_all()
+                self._write(batch)
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+    def _write(self, batch):
+        try:
+            try:
+                with transaction.atomic():
+                    rejected = self.write([item.obj for item in batch])
+            except Exception:
+                logger.exception(
+                    "Пачка из %s записей не записалась, пишем по одной",
+                    len(batch),
+                )
+                for item in batch:
+                    item.error = _save_one(item.obj)
+            else:
+                errors = {id(obj): error for obj, error in rejected}
+                for item in batch:
+                    item.error = errors.get(id(item.obj))
+        finally:
+            with self._condition:
+                for item in batch:
+                    item.done = True
+                self._condition.notify_all()
+
+
+def _save_one(obj):
+    # id, выданный в неудачной пачке, мог оказаться занят
+    obj.pk = None
+    try:
+        with transaction.atomic():
+            obj.save()
+    except Exception as error:
+        return error
+    return None
+
+
+def _write_posts(posts):
+    write_posts(posts)
+    transaction.on_commit(feed_cache.invalidate)
+    return []
+
+
+def _write_comments(comments):
+    _, rejected = write_comments(comments)
+    return [(comment, Http404(message)) for comment, message in rejected]
+
+
+WRITERS = {Post: _write_posts, Comment: _write_comments}
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _batcher(model):
+    with _batchers_lock:
+        batcher = _batchers.get(model)
+        if batcher is None:
+            batcher = _batchers[model] = Batcher(
+                WRITERS[model],
+                max_pending=getattr(settings, "WRITE_BEHIND_MAX_PENDING", 1000),
+                batch_size=getattr(settings, "WRITE_BEHIND_BATCH_SIZE", 100),
+                interval=getattr(settings, "WRITE_BEHIND_INTERVAL", 0.002),
+                timeout=getattr(settings, "WRITE_BEHIND_TIMEOUT", 1.0),
+            )
+        return batcher
+
+
+def save(obj):
+    """Сохранить новый пост или комментарий: пачкой, если включено"""
+    if not getattr(settings, "WRITE_BEHIND", False) \
+            or getattr(obj, "image", None):
+        obj.save()
+        return obj
+    return _batcher(type(obj)).submit(obj)
@@ -0,0 +1,314 @@
+"""Кеш в файле SQLite, общий для всех процессов на одной машине.
+
+LocMemCache у каждого воркера свой: процессы греют каждый свою копию, а
+инвалидация в одном не видна остальным. Этот бэкенд хранит записи в
+одном файле SQLite (режим WAL, читатели не блокируются писателем) и не
+требует внешних сервисов.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "yatube.cache.SQLiteCache",
+            "LOCATION": "/var/tmp/yatube-cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 100000, "MAX_SIZE": 256 * 2 ** 20},
+        }
+    }
+
+* Вытеснение LRU: при превышении MAX_ENTRIES записей или MAX_SIZE байт
+  удаляется 1/CULL_FREQUENCY самых давно читавшихся записей. Время
+  чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд, чтобы
+  чтения почти не превращались в записи.
+* Число записей и их объём поддерживаются триггерами, а не COUNT(*).
+* Попадания и промахи считаются в памяти процесса и сбрасываются в
+  общую таблицу раз в STATS_FLUSH_SECONDS; cache.stats() возвращает
+  сумму по всем процессам.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+INSERT OR IGNORE INTO meta VALUES
+    ('entries', 0), ('size', 0), ('hits', 0), ('misses', 0), ('evictions', 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE meta SET value = value + 1 WHERE name = 'entries';
+    UPDATE meta SET value = value + new.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE meta SET value = value - 1 WHERE name = 'entries';
+    UPDATE meta SET value = value - old.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE meta SET value = value + new.size - old.size WHERE name = 'size';
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+"""
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._max_size = int(options.get("MAX_SIZE", 64 * 2 ** 20))
+        self._access_resolution = float(options.get("ACCESS_RESOLUTION", 5))
+        self._stats_flush = float(options.get("STATS_FLUSH_SECONDS", 5))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0}
+        self._flushed_at = time.time()
+
+    # соединения
+
+    @property
+    def _db(self):
+        """Своё соединение на каждый поток; после fork — новое"""
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def close(self, **kwargs):
+        # соединение живёт весь поток: закрывать его на каждый запрос
+        # (Django вызывает close() по окончании запроса) слишком дорого
+        pass
+
+    # статистика
+
+    def _count(self, hits=0, misses=0):
+        with self._lock:
+            self._pending["hits"] += hits
+            self._pending["misses"] += misses
+            due = time.time() - self._flushed_at >= self._stats_flush
+        if due:
+            self._flush_stats()
+
+    def _flush_stats(self):
+        with self._lock:
+            pending, self._pending = self._pending, {"hits": 0, "misses": 0}
+            self._flushed_at = time.time()
+        self._db.executemany(
+            "UPDATE meta SET value = value + ? WHERE name = ?",
+            [(value, name) for name, value in pending.items() if value],
+        )
+
+    def stats(self):
+        """Попадания, промахи, вытеснения, число записей и объём"""
+        self._flush_stats()
+        stats = dict(self._db.execute("SELECT name, value FROM meta"))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    # вспомогательное
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _touch_accessed(self, keys, now):
+        self._db.executemany(
+            "UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?",
+            [(now, key, now - self._access_resolution) for key in keys],
+        )
+
+    def _cull(self):
+        entries, size = (
+            value for _, value in self._db.execute(
+                "SELECT name, value FROM meta "
+                "WHERE name IN ('entries', 'size') ORDER BY name"
+            )
+        )
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        now = time.time()
+        deleted = self._db.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?",
+            [now],
+        ).rowcount
+        if self._cull_frequency == 0:
+            deleted += self._db.execute("DELETE FROM cache").rowcount
+        else:
+            deleted += self._db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY accessed LIMIT ?)",
+                [max(entries // self._cull_frequency, 1)],
+            ).rowcount
+        self._db.execute(
+            "UPDATE meta SET value = value + ? WHERE name = 'evictions'",
+            [deleted],
+        )
+
+    # API кеша Django
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self._db.execute(
+            "SELECT value, expires, accessed FROM cache WHERE key = ?", [key]
+        ).fetchone()
+        if row is None or row[1] is not None and row[1] <= now:
+            self._count(misses=1)
+            return default
+        self._count(hits=1)
+        if row[2] < now - self._access_resolution:
+            self._touch_accessed([key], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ", ".join("?" * len(keys))
+        rows = self._db.execute(
+            "SELECT key, value, expires, accessed FROM cache "
+            f"WHERE key IN ({placeholders})",
+            list(keys),
+        ).fetchall()
+        found = {}
+        stale = []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[keys[key]] = pickle.loads(value)
+            if accessed < now - self._access_resolution:
+                stale.append(key)
+        self._count(hits=len(found), misses=len(keys) - len(found))
+        if stale:
+            self._touch_accessed(stale, now)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._db.execute(
+            UPSERT,
+            [key, data, self._expires(timeout), time.time(), len(data)],
+        )
+        self._cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append(
+                [self._key(key, version), value, expires, now, len(value)]
+            )
+        with self._transaction():
+            self._db.executemany(UPSERT, rows)
+        self._cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Записать, только если ключа нет или он истёк — атомарно"""
+        key = self._key(key, version)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        added = self._db.execute(
+            UPSERT + " WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            [key, data, self._expires(timeout), now, len(data), now],
+        ).rowcount
+        if added:
+            self._cull()
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._db.execute(
+            "UPDATE cache SET expires = ? WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            [self._expires(timeout), key, time.time()],
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute("DELETE FROM cache WHERE key = ?", [key])
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            "DELETE FROM cache WHERE key = ?",
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            "SELECT 1 FROM cache WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            [key, time.time()],
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарное приращение: чтение и запись в одной транзакции"""
+        key = self._key(key, version)
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                [key, time.time()],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            self._db.execute(
+                "UPDATE cache SET value = ?, size = ? WHERE key = ?",
+                [data, len(data), key],
+            )
+        return value
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE … COMMIT: блокировка записи берётся сразу"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,304 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+MetricsMiddleware для каждого запроса считает время ответа, число SQL-
+запросов и время в базе (connection.execute_wrapper), время отрисовки
+шаблонов и попадания/промахи кеша, и складывает их по имени URL (view
+name) в памяти процесса. Страница /metrics/ отдаёт накопленное в формате
+Prometheus; доступ — сотрудникам или по заголовку
+``Authorization: Bearer <METRICS_TOKEN>``.
+
+Метрики у каждого процесса свои: при нескольких воркерах Prometheus
+должен опрашивать их по отдельности (или агрегировать по instance).
+
+Накладные расходы — несколько вызовов perf_counter и инкрементов на
+запрос и на SQL-запрос, см. ``python -m benchmarks.bench_metrics``.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template as DjangoTemplate
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = "<unresolved>"
+
+_current = ContextVar("metrics_request", default=None)
+_MISSING = object()
+
+
+class RequestStats:
+    """Счётчики одного запроса"""
+    __slots__ = (
+        "queries", "db_seconds", "template_seconds", "template_depth",
+        "cache_hits", "cache_misses",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class ViewStats:
+    """Накопленные метрики одного view"""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, status, seconds, request_stats):
+        status = f"{status // 100}xx"
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            bucket = bisect_left(BUCKETS, seconds)
+            if bucket < len(BUCKETS):
+                stats.buckets[bucket] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.queries += request_stats.queries
+            stats.db_seconds += request_stats.db_seconds
+            stats.template_seconds += request_stats.template_seconds
+            stats.cache_hits += request_stats.cache_hits
+            stats.cache_misses += request_stats.cache_misses
+
+    def views(self):
+        with self._lock:
+            return dict(self._views)
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        views = sorted(self.views().items())
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(
+                    f'{key}="{_escape(value)}"' for key, value in labels
+                )
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        histogram = []
+        for view, stats in views:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.buckets):
+                cumulative += count
+                histogram.append(
+                    ("_bucket", [("view", view), ("le", bound)], cumulative)
+                )
+            histogram.append(
+                ("_bucket", [("view", view), ("le", "+Inf")], stats.count)
+            )
+            histogram.append(("_sum", [("view", view)], stats.seconds))
+            histogram.append(("_count", [("view", view)], stats.count))
+        family(
+            "yatube_request_duration_seconds", "histogram",
+            "Время ответа по view", histogram,
+        )
+        family(
+            "yatube_requests_total", "counter", "Ответы по view и классу статуса",
+            [
+                ("", [("view", view), ("status", status)], count)
+                for view, stats in views
+                for status, count in sorted(stats.statuses.items())
+            ],
+        )
+        family(
+            "yatube_db_queries_total", "counter", "SQL-запросы по view",
+            [("", [("view", view)], stats.queries) for view, stats in views],
+        )
+        family(
+            "yatube_db_duration_seconds_total", "counter",
+            "Время выполнения SQL-запросов по view",
+            [("", [("view", view)], stats.db_seconds) for view, stats in views],
+        )
+        family(
+            "yatube_template_duration_seconds_total", "counter",
+            "Время отрисовки шаблонов по view",
+            [
+                ("", [("view", view)], stats.template_seconds)
+                for view, stats in views
+            ],
+        )
+        family(
+            "yatube_cache_requests_total", "counter",
+            "Чтения из кеша по view: попадания и промахи",
+            [
+                ("", [("view", view), ("result", result)], count)
+                for view, stats in views
+                for result, count in (
+                    ("hit", stats.cache_hits), ("miss", stats.cache_misses)
+                )
+            ],
+        )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n"
+    )
+
+
+# перехватчики
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None or stats.template_depth:
+            # вложенная отрисовка уже учтена во внешней
+            return render(self, *args, **kwargs)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.template_depth -= 1
+            stats.template_seconds += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        stats = _current.get()
+        if stats is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        stats = _current.get()
+        keys = list(keys)
+        found = get_many(self, keys, version)
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.instrumented = True
+    return wrapper
+
+
+_install_lock = threading.Lock()
+
+
+def install():
+    """Подключить счётчики шаблонов и кеша (один раз на процесс)
+
+    У шаблонов и кешей Django нет сигналов для этого в рабочем режиме,
+    поэтому оборачиваются методы классов: Template.render бэкенда
+    шаблонов Django и get/get_many используемых бэкендов кеша."""
+    with _install_lock:
+        if not getattr(DjangoTemplate.render, "instrumented", False):
+            DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+        for alias in settings.CACHES:
+            backend = type(caches[alias])
+            if not getattr(backend.get, "instrumented", False):
+                backend.get = _counted_get(backend.get)
+            # базовый get_many читает через get и уже посчитан
+            if backend.get_many is not BaseCache.get_many and not getattr(
+                backend.get_many, "instrumented", False
+            ):
+                backend.get_many = _counted_get_many(backend.get_many)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_count_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else UNRESOLVED,
+            response.status_code,
+            time.perf_counter() - started,
+            stats,
+        )
+        return response
+
+
+def metrics(request):
+    """Метрики для Prometheus: сотрудникам или по токену"""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    authorized = request.user.is_staff or bool(token) and hmac.compare_digest(
+        header, f"Bearer {token}"
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,142 @@
+"""Поиск N+1 запросов: одинаковых SELECT из одного места кода.
+
+NPlusOneMiddleware следит за SQL-запросами запроса (через
+connection.execute_wrapper) и группирует их по «форме» — тексту SQL без
+параметров — и по месту вызова: первой строке кода проекта в стеке и
+узлу шаблона, если запрос случился при отрисовке. Если одна группа
+повторилась NPLUSONE_THRESHOLD раз, это почти наверняка запрос на
+каждую строку списка (забытый select_related и т.п.).
+
+Режим задаётся NPLUSONE_MODE:
+
+* "raise" — сразу исключение NPlusOneError (в тестах: регрессия ломает
+  тест, а трассировка указывает на виновника);
+* "log" — предупреждение в лог после ответа; проверяется только доля
+  запросов NPLUSONE_SAMPLE_RATE, чтобы обход стека не стоил дорого;
+* "off" — выключено.
+"""
+import logging
+import os
+import random
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_BASE = os.path.join("django", "template", "base.py")
+# обёртки запросов самого проекта — не место вызова
+WRAPPERS = tuple(
+    os.path.join(ROOT, "yatube", name) for name in ("nplusone.py", "metrics.py")
+)
+
+IN_LIST_RE = re.compile(r"\((?:%s, )*%s\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def normalize(sql):
+    """Форма запроса: списки IN любой длины и числа в тексте совпадают"""
+    return NUMBER_RE.sub("?", IN_LIST_RE.sub("(...)", sql))
+
+
+def call_site():
+    """(место в коде проекта, место в шаблоне или None) для запроса"""
+    frame = sys._getframe(2)
+    code_location = template_location = None
+    while frame is not None and code_location is None:
+        code = frame.f_code
+        filename = code.co_filename
+        if template_location is None and code.co_name == "render_annotated" \
+                and filename.endswith(TEMPLATE_BASE):
+            # ближайший узел шаблона, который выполнял отрисовку
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                template_location = f"{origin.template_name}:{token.lineno}"
+        elif filename.startswith(ROOT) and "-packages" not in filename \
+                and not filename.startswith(WRAPPERS):
+            code_location = (
+                f"{os.path.relpath(filename, ROOT)}:{frame.f_lineno} "
+                f"({code.co_name})"
+            )
+        frame = frame.f_back
+    return code_location, template_location
+
+
+class Detector:
+    def __init__(self, threshold, raise_errors):
+        self.threshold = threshold
+        self.raise_errors = raise_errors
+        self.counts = {}
+        self.failed = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # после исключения запросы идут уже из обработки ошибки
+        if not self.failed and not many \
+                and sql.lstrip()[:6].upper() == "SELECT":
+            key = (normalize(sql), *call_site())
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+            if self.raise_errors and count == self.threshold:
+                self.failed = True
+                raise NPlusOneError(self.describe(key, count))
+        return execute(sql, params, many, context)
+
+    @staticmethod
+    def describe(key, count):
+        sql, code_location, template_location = key
+        where = code_location or "?"
+        if template_location:
+            where += f", шаблон {template_location}"
+        return f"{count} одинаковых запросов из {where}: {sql}"
+
+    def problems(self):
+        return [
+            (key, count) for key, count in self.counts.items()
+            if count >= self.threshold
+        ]
+
+    @contextmanager
+    def watch(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+def detect(raise_errors=True):
+    """Проверка участка кода вне запроса: ``with detect(): ...``"""
+    threshold = getattr(settings, "NPLUSONE_THRESHOLD", 5)
+    return Detector(threshold, raise_errors).watch()
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, "NPLUSONE_MODE", "log")
+        if mode == "off" or mode == "log" and random.random() >= getattr(
+            settings, "NPLUSONE_SAMPLE_RATE", 0.01
+        ):
+            return self.get_response(request)
+        detector = Detector(
+            getattr(settings, "NPLUSONE_THRESHOLD", 5), mode == "raise"
+        )
+        with detector.watch():
+            response = self.get_response(request)
+        if detector.raise_errors:
+            return response
+        for key, count in detector.problems():
+            logger.warning(
+                "N+1 на %s: %s", request.path, detector.describe(key, count)
+            )
+        return response
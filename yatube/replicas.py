@@ -0,0 +1,119 @@
+"""Чтение с реплик и запись в основную базу.
+
+ReplicaMiddleware отправляет GET- и HEAD-запросы к страницам из
+REPLICA_VIEWS (имена URL) на случайную реплику из REPLICAS; всё
+остальное, включая любые записи, идёт в default. Чтение после записи в
+том же запросе, чтение для записи (select_for_update, get_or_create) и
+сессии тоже идут в default: от сессии зависит, вошёл ли пользователь.
+
+Реплика отстаёт от основной базы, поэтому после записи пользователь на
+REPLICA_PIN_SECONDS закрепляется за default (cookie PIN_COOKIE) и сразу
+видит свой пост или комментарий. Закрепляет и любой небезопасный метод
+(POST и т. п.), даже если в этом потоке записи не было: при групповой
+записи (posts/write_behind.py) INSERT выполняет поток другого запроса.
+
+Локально репликами служат копии файла SQLite (YATUBE_REPLICAS в
+settings.py), их обновляет ``python manage.py sync_replicas``. В тестах
+реплики зеркалят default (TEST["MIRROR"]).
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+DEFAULT = "default"
+PIN_COOKIE = "primary_until"
+# от сессии зависит вход пользователя: всегда из основной базы
+PRIMARY_APPS = {"sessions"}
+# методы, после которых пользователь не закрепляется за default
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE"}
+
+_routing = ContextVar("replica_routing", default=None)
+
+
+class Routing:
+    """Решение для текущего запроса: реплика для чтения (или None) и
+    была ли запись"""
+    __slots__ = ("replica", "wrote")
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+@contextmanager
+def primary():
+    """Читать из основной базы внутри блока, даже на странице реплики"""
+    routing = _routing.get()
+    replica = routing.replica if routing else None
+    if routing:
+        routing.replica = None
+    try:
+        yield
+    finally:
+        if routing:
+            routing.replica = replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        # после записи в этом же запросе читать её из основной базы
+        if routing is None or routing.replica is None or routing.wrote \
+                or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты из них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, "REPLICAS", ()):
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = Routing(None)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote or request.method not in SAFE_METHODS:
+            seconds = getattr(settings, "REPLICA_PIN_SECONDS", 10)
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds,
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = getattr(settings, "REPLICAS", ())
+        if not replicas or request.method not in ("GET", "HEAD") \
+                or request.resolver_match.url_name not in getattr(
+                    settings, "REPLICA_VIEWS", ()
+                ) or self.pinned(request):
+            return None
+        _routing.get().replica = random.choice(replicas)
+        return None
+
+    @staticmethod
+    def pinned(request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым: время ответа включает все остальные middleware
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.nplusone.NPlusOneMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,13 +91,34 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с WAL, mmap и прочими PRAGMA на каждом соединении (yatube/sqlite)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
+# Реплики только для чтения (yatube/replicas.py). YATUBE_REPLICAS — пути к
+# копиям базы через запятую; обновляются командой sync_replicas
+REPLICAS = []
+for number, replica_path in enumerate(
+    filter(None, os.environ.get("YATUBE_REPLICAS", "").split(",")), start=1
+):
+    REPLICAS.append(f"replica{number}")
+    DATABASES[REPLICAS[-1]] = {
+        **DATABASES['default'],
+        'NAME': replica_path,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+# Страницы (имена URL), которые читают с реплик
+REPLICA_VIEWS = ('index', 'hot_index', 'group', 'profile', 'post', 'search')
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -152,8 +178,74 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 # Идентификатор текущего сайта
 SITE_ID = 1
 
+# Режим постраничного вывода лент: "offset" (номера страниц) или "cursor"
+# (keyset по pub_date и id, без COUNT и OFFSET). Курсорный режим также
+# включается для отдельного запроса параметром ?cursor=
+POSTS_PAGINATION = "offset"
+
+# Авторы, у которых больше подписчиков, не раскладывают посты по лентам:
+# их посты подмешиваются в ленту подписок при чтении. Обратно авторы
+# возвращаются, когда подписчиков меньше FEED_FANOUT_MIN_FOLLOWERS; их
+# посты раскладываются по лентам в фоне (FEED_BACKFILL_ASYNC)
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_FANOUT_MIN_FOLLOWERS = 800
+FEED_BACKFILL_ASYNC = True
+# Сколько последних постов автора попадает в ленту при подписке
+FEED_BACKFILL_POSTS = 200
+
+# Кеш страниц ленты: сколько секунд страница считается свежей и сколько
+# ещё может отдаваться устаревшей, пока один процесс её пересчитывает
+FEED_CACHE_FRESH_SECONDS = 20
+FEED_CACHE_STALE_SECONDS = 600
+
+# Миниатюры картинок постов готовятся в пуле потоков вне запроса
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Токен для /metrics/ (Authorization: Bearer <токен>); без него страница
+# метрик доступна только сотрудникам
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Поиск N+1 запросов (yatube/nplusone.py): в тестах — исключение, в работе —
+# предупреждение в лог для доли запросов
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+NPLUSONE_MODE = "raise" if TESTING else "log"
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_SAMPLE_RATE = 0.01
+# Групповая запись новых постов и комментариев при всплесках
+# (posts/write_behind.py); YATUBE_WRITE_BEHIND=1 включает её
+WRITE_BEHIND = os.environ.get("YATUBE_WRITE_BEHIND") == "1"
+WRITE_BEHIND_INTERVAL = 0.002
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_MAX_PENDING = 1000
+WRITE_BEHIND_TIMEOUT = 1.0
+# Лента «Популярное» (posts/hot.py): вес публикации растёт с числом
+# подписчиков автора, каждый комментарий добавляет HOT_COMMENT_WEIGHT,
+# и любой вклад вдвое слабеет за HOT_HALF_LIFE_HOURS часов
+HOT_HALF_LIFE_HOURS = 12
+HOT_COMMENT_WEIGHT = 1.0
+HOT_REACH_WEIGHT = 0.5
+HOT_POSTS = 100
+# Рекомендации «кого читать» (posts/suggestions.py): сколько хранить на
+# пользователя после manage.py build_suggestions и сколько показывать
+SUGGESTIONS_PER_USER = 10
+SUGGESTIONS_SHOWN = 5
+# Ширины вариантов картинки для srcset (JPEG, WebP и AVIF, если доступен)
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# При нескольких воркерах LocMemCache у каждого свой. YATUBE_SHARED_CACHE=1
+# включает общий для всех процессов кеш в файле SQLite (yatube/cache.py)
+if os.environ.get("YATUBE_SHARED_CACHE") == "1":
+    CACHES['default'] = {
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
+    }
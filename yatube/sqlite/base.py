@@ -0,0 +1,88 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+Стандартный бэкенд открывает базу с настройками по умолчанию: журнал
+отката (читатели ждут, пока писатель зафиксирует транзакцию), fsync на
+каждую фиксацию, маленький кеш страниц. Этот бэкенд на каждом новом
+соединении выполняет PRAGMA из OPTIONS["pragmas"] (по умолчанию
+PRAGMAS: WAL, synchronous=NORMAL, mmap, кеш, busy_timeout, временные
+таблицы в памяти) и затем OPTIONS["init_command"], если задан.
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "yatube.sqlite",
+            "NAME": "db.sqlite3",
+            "CONN_MAX_AGE": 60,
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        }
+    }
+
+transaction_mode = "IMMEDIATE" начинает транзакции (atomic) с
+BEGIN IMMEDIATE: блокировка записи берётся сразу и ожидается с
+busy_timeout. С DEFERRED транзакция, которая сначала читает, а потом
+пишет, в WAL получает «database is locked» без ожидания, если другой
+писатель успел зафиксироваться. Для базы в памяти (тесты) режим не
+меняется.
+
+Постоянные соединения (CONN_MAX_AGE) Django закрывает по возрасту в
+начале и конце запроса. Соединение, унаследованное процессом через
+fork, SQLite использовать запрещает: дочерний процесс открывает своё.
+"""
+import os
+
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    # первым: следующие PRAGMA тоже могут ждать блокировку
+    "busy_timeout": 5000,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 2 ** 20,
+    # отрицательное значение — размер в КиБ, а не в страницах
+    "cache_size": -32 * 2 ** 10,
+    "temp_store": "MEMORY",
+}
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pid = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop("pragmas", PRAGMAS)
+        self.init_command = params.pop("init_command", None)
+        self.transaction_mode = params.pop(
+            "transaction_mode", "DEFERRED"
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f"transaction_mode: {self.transaction_mode!r}"
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.init_command:
+            conn.executescript(self.init_command)
+        self.pid = os.getpid()
+        return conn
+
+    def ensure_connection(self):
+        if self.connection is not None and self.pid != os.getpid():
+            # соединение родителя: не закрывать, а просто забыть
+            self.connection = None
+        super().ensure_connection()
+
+    def _close(self):
+        if self.pid == os.getpid():
+            super()._close()
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode == "DEFERRED" or self.is_in_memory_db():
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import include, path
 
+from yatube.metrics import metrics
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
@@ -18,6 +20,8 @@ urlpatterns = [
     path("auth/", include("django.contrib.auth.urls")),
     #  раздел администратора
     path("admin/", admin.site.urls), 
+    #  метрики для Prometheus
+    path("metrics/", metrics, name="metrics"),
     #  обработчик для главной страницы ищем в urls.py приложения posts
 ]
 